@@ -1,7 +1,12 @@
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q, Value
+from django.db.models.functions import Upper
 from django_filters import rest_framework as filters
-from .models import Book
+from .models import Book, SEARCH_CONFIG
 
 class BookFilter(filters.FilterSet):
+    q = filters.CharFilter(method='filter_search')
     title = filters.CharFilter(lookup_expr='icontains')
     author = filters.CharFilter(lookup_expr='icontains')
     description = filters.CharFilter(lookup_expr='icontains')
@@ -13,6 +18,16 @@ class BookFilter(filters.FilterSet):
     def filter_by_user(self, queryset,name,value):
         return queryset.filter(created_by__id=value)
 
+    def filter_search(self, queryset, name, value):
+        # Full-text matches come from the GIN index on search_vector; titles a
+        # typo away from a query word are picked up by the trigram index on
+        # UPPER(title) and only add a small similarity term to the rank.
+        query = SearchQuery(value, search_type='websearch', config=SEARCH_CONFIG)
+        similar_title = TrigramWordSimilar(Upper('title'), Upper(Value(value)))
+        return queryset.filter(Q(search_vector=query) | Q(similar_title)).annotate(
+            search_rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(value, 'title') / 10
+        )
+
     class Meta:
         model = Book
         fields = ['title', 'author', 'description', 'created_by', 'created_at', 'updated_at']
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.book.models import Book
+
+
+async def fetch(host, port, path, headers):
+    # A bare HTTP/1.1 client, so the load generator itself stays cheap next to
+    # the server under test.
+    reader, writer = await asyncio.open_connection(host, port)
+    lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close', *headers, '', '']
+    writer.write('\r\n'.join(lines).encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(host, port, path, headers, total, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, path, headers)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+class Command(BaseCommand):
+    help = 'Compares requests/sec and p99 latency of the sync and async read endpoints of a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8001', help='An ASGI server, e.g. the asgi service')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument(
+            '--token', help='API token sent with the review list requests to include token auth; anonymous without one'
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        host, port = url.hostname, url.port or 80
+        book_id = Book.objects.values_list('id', flat=True).first()
+        if book_id is None:
+            raise CommandError('No books to read; run fetch_books first.')
+
+        review_headers = [f"Authorization: Token {options['token']}"] if options['token'] else []
+        pairs = [
+            ('book list', '/book/', '/book/async/', []),
+            ('book detail', f'/book/{book_id}/', f'/book/async/{book_id}/', []),
+            ('average ratings', '/review/average_ratings/', '/review/async/average_ratings/', []),
+            ('review list', '/review/', '/review/async/', review_headers),
+        ]
+
+        for label, sync_path, async_path, headers in pairs:
+            for kind, path in [('sync', sync_path), ('async', async_path)]:
+                elapsed, latencies, errors = asyncio.run(
+                    load(host, port, path, headers, options['requests'], options['concurrency'])
+                )
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                self.stdout.write(
+                    f'{label} ({kind}): {len(latencies) / elapsed:.0f} req/s, '
+                    f'p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms, {errors} errors'
+                )
@@ -1,52 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
-from django.core.management.base import BaseCommand
+from requests.adapters import HTTPAdapter
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from apps.book.models import Book
 from apps.user.models import CustomUser
+from config.caching import invalidate_model
 import logging
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_BOOKS_URL = 'https://www.googleapis.com/books/v1/volumes'
+GOOGLE_BOOKS_SOURCE = 'google_books'
+# The Google Books API returns at most 40 volumes per request.
+MAX_PAGE_SIZE = 40
+# Columns refreshed when a re-import hits a book that already exists.
+UPSERT_FIELDS = ['title', 'author', 'description', 'updated_at']
+
+
+def book_from_item(item, created_by):
+    volume_info = item.get('volumeInfo', {})
+    return Book(
+        title=volume_info.get('title', 'No Title')[:255],
+        author=', '.join(volume_info.get('authors', ['Unknown Author']))[:255],
+        description=volume_info.get('description', 'No Description'),
+        created_by=created_by,
+        source=GOOGLE_BOOKS_SOURCE,
+        external_id=item.get('id'),
+    )
+
+
 class Command(BaseCommand):
     help = 'Fetches books data from Google Books API and populates the Book model'
 
-    def handle(self, *args, **kwargs):
-        query = "Django"  # You can replace this with any search query
-        max_results = 10  # Limit the number of results
-        url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results}"
-        response = requests.get(url)
-        data = response.json()
-
-        if 'items' in data:
-            for index, item in enumerate(data['items']):
-                if index >= max_results:
-                    break  # Stop after processing 10 books
-                
-                title = item['volumeInfo'].get('title', 'No Title')
-                author = ', '.join(item['volumeInfo'].get('authors', ['Unknown Author']))
-                description = item['volumeInfo'].get('description', 'No Description')
-
-                logger.info(f"Processing book: {title}")
-
-                try:
-                    created_by = CustomUser.objects.get(id=14)
-                except CustomUser.DoesNotExist:
-                    logger.error("CustomUser with id 14 does not exist.")
-                    return
-                except Exception as e:
-                    logger.error(f"Unexpected error occurred when fetching CustomUser: {e}")
-                    return
-
-                try:
-                    book = Book.objects.create(
-                        title=title,
-                        author=author,
-                        description=description,
-                        created_by=created_by,
-                        
-                    )
-                    logger.info(f"Book '{book.title}' created successfully.")
-                except Exception as e:
-                    logger.error(f"Failed to create book '{title}': {e}")
-
-        self.stdout.write(self.style.SUCCESS('Command executed'))
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['Django'], help='Search queries to import')
+        parser.add_argument('--limit', type=int, default=10, help='Maximum number of books per query')
+        parser.add_argument('--page-size', type=int, default=MAX_PAGE_SIZE)
+        parser.add_argument('--workers', type=int, default=8, help='Number of pages fetched concurrently')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert')
+        parser.add_argument('--owner', default='14', help='Id or email of the user the books are created by')
+        parser.add_argument('--base-url', default=GOOGLE_BOOKS_URL)
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        created_by = self.get_owner(options['owner'])
+        page_size = max(1, min(options['page_size'], MAX_PAGE_SIZE))
+        pages = [
+            (query, start, min(page_size, options['limit'] - start))
+            for query in options['queries']
+            for start in range(0, options['limit'], page_size)
+        ]
+
+        started = time.perf_counter()
+        imported = 0
+        pending = []
+        with self.get_session(options['workers']) as session, ThreadPoolExecutor(options['workers']) as executor:
+            futures = [
+                executor.submit(self.fetch_page, session, options['base_url'], query, start, count, options['timeout'])
+                for query, start, count in pages
+            ]
+            # Pages are fetched on worker threads; rows are only built and
+            # inserted here, on the thread that owns the database connection.
+            for future in as_completed(futures):
+                for item in future.result():
+                    pending.append(book_from_item(item, created_by))
+                if len(pending) >= options['batch_size']:
+                    imported += self.insert(pending)
+                    pending = []
+        imported += self.insert(pending)
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Command executed: upserted {imported} books from {len(pages)} pages in {elapsed:.2f}s ({rate:.0f} items/sec)'
+        ))
+
+    def get_owner(self, owner):
+        lookup = {'id': owner} if owner.isdigit() else {'email': owner}
+        try:
+            return CustomUser.objects.only('id').get(**lookup)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"CustomUser {owner} does not exist.")
+
+    def get_session(self, workers):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch_page(self, session, base_url, query, start, count, timeout):
+        params = {'q': query, 'startIndex': start, 'maxResults': count}
+        try:
+            response = session.get(base_url, params=params, timeout=timeout)
+            response.raise_for_status()
+            items = response.json().get('items', [])
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Failed to fetch '{query}' page at {start}: {e}")
+            return []
+        logger.info(f"Fetched {len(items)} books for '{query}' at {start}")
+        return items[:count]
+
+    def insert(self, books):
+        # Overlapping queries return the same volume more than once, and
+        # ON CONFLICT can't touch one row twice in a statement, so dedupe first.
+        # Volumes without an id can't be matched on re-import and are skipped.
+        books = list({(book.source, book.external_id): book for book in books if book.external_id}.values())
+        if not books:
+            return 0
+        try:
+            Book.objects.bulk_create(
+                books,
+                update_conflicts=True,
+                unique_fields=['source', 'external_id'],
+                update_fields=UPSERT_FIELDS,
+            )
+        except Exception as e:
+            logger.error(f"Failed to upsert {len(books)} books: {e}")
+            return 0
+        # bulk_create sends no post_save, so drop cached book responses here.
+        invalidate_model(Book)
+        logger.info(f"{len(books)} books upserted successfully.")
+        return len(books)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from apps.book.models import Book, RATING_AGGREGATE_FIELDS, empty_rating_histogram
+from apps.review.models import Opinion
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuilds the rating count, sum and histogram on every Book from its Opinion rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            # Each batch locks its books before counting, so reviews written
+            # concurrently through ReviewViewSet are neither lost nor doubled.
+            with transaction.atomic():
+                books = list(
+                    Book.all_objects.select_for_update()
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .only('id', *RATING_AGGREGATE_FIELDS)[:batch_size]
+                )
+                if not books:
+                    break
+
+                histograms = {}
+                totals = (
+                    Opinion.all_objects.filter(book_id__in=[book.id for book in books])
+                    .values_list('book_id', 'rating')
+                    .annotate(total=Count('id'))
+                    .order_by()
+                )
+                for book_id, rating, total in totals:
+                    histograms.setdefault(book_id, empty_rating_histogram())[rating] = total
+
+                for book in books:
+                    book.set_rating_histogram(histograms.get(book.id, empty_rating_histogram()))
+                Book.all_objects.bulk_update(books, RATING_AGGREGATE_FIELDS)
+
+            last_id = books[-1].id
+            rebuilt += len(books)
+            logger.info(f"Rebuilt rating aggregates for {rebuilt} books")
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {rebuilt} books'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from apps.book.models import Book, Favorite
+from config.caching import invalidate_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recounts Book.favorite_count from the Favorite rows and repairs any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        checked = 0
+        repaired = 0
+
+        while True:
+            # Locking the batch keeps concurrent favorites from landing between
+            # the count and the write.
+            with transaction.atomic():
+                books = list(
+                    Book.all_objects.select_for_update()
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .only('id', 'favorite_count')[:batch_size]
+                )
+                if not books:
+                    break
+
+                counts = dict(
+                    Favorite.all_objects.filter(book_id__in=[book.id for book in books])
+                    .values_list('book_id')
+                    .annotate(total=Count('id'))
+                    .order_by()
+                )
+                drifted = []
+                for book in books:
+                    favorite_count = counts.get(book.id, 0)
+                    if book.favorite_count != favorite_count:
+                        book.favorite_count = favorite_count
+                        drifted.append(book)
+                Book.all_objects.bulk_update(drifted, ['favorite_count'])
+                if drifted:
+                    invalidate_model(Book)
+
+            last_id = books[-1].id
+            checked += len(books)
+            repaired += len(drifted)
+            logger.info(f"Reconciled favorite counts for {checked} books, {repaired} repaired")
+
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} books, repaired {repaired} favorite counts'))
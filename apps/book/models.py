@@ -1,8 +1,46 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models
+from django.db.models import F
+from django.db.models.functions import Greatest, Upper
 from django.conf import settings
 from django.utils import timezone
 
 from apps.user.models import CustomUser
+from config.caching import invalidate_model
+
+# Opinion.rating is validated to 0..5, so the histogram has one bucket per star.
+RATING_SCALE = range(0, 6)
+RATING_AGGREGATE_FIELDS = ['rating_count', 'rating_sum', 'rating_histogram']
+SEARCH_CONFIG = 'english'
+
+
+def empty_rating_histogram():
+    return [0 for _ in RATING_SCALE]
+
+
+class BookManager(models.Manager):
+    # All rows, tombstones included. Use it for writes that must also reach
+    # soft-deleted books, e.g. aggregates of reviews on a book being deleted.
+    def adjust_favorite_counts(self, book_ids, delta):
+        # A single UPDATE with F() so concurrent (un)favorites never lose counts.
+        if book_ids:
+            self.filter(id__in=book_ids).update(favorite_count=Greatest(F('favorite_count') + delta, 0))
+            invalidate_model(self.model)
+
+    def adjust_ratings(self, book_id, added=(), removed=()):
+        # Must run inside the transaction that wrote the opinions; the row lock
+        # serializes concurrent reviews of the same book.
+        book = self.select_for_update().only('id', *RATING_AGGREGATE_FIELDS).get(pk=book_id)
+        book.apply_rating_change(added=added, removed=removed)
+        book.save(update_fields=RATING_AGGREGATE_FIELDS)
+        return book
+
+
+class LiveBookManager(BookManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
 
 class Book(models.Model):
     title = models.CharField(max_length=255)
@@ -12,13 +50,155 @@ class Book(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Identifies books imported from an external catalogue, e.g. a Google Books
+    # volume id, so re-imports update rows in place. Null for books created
+    # through the API.
+    source = models.CharField(max_length=32, blank=True, default='')
+    external_id = models.CharField(max_length=64, null=True, blank=True)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_histogram = models.JSONField(default=empty_rating_histogram, editable=False)
+    weighted_rating = models.FloatField(default=0, editable=False)
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('author', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    # The default manager hides soft-deleted books from every read path,
+    # including the admin, serializer fields and related lookups.
+    objects = LiveBookManager()
+    all_objects = BookManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'external_id'], name='book_unique_external_id'),
+        ]
+        indexes = [
+            # Live rows by id, for average_ratings paging and id lookups that skip tombstones.
+            models.Index(fields=['id'], name='book_live_id_idx', condition=models.Q(is_deleted=False)),
+            # Tombstones by age, for the purge task.
+            models.Index(fields=['deleted_at'], name='book_deleted_at_idx', condition=models.Q(is_deleted=True)),
+            # Keyset pagination of the book list.
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='book_created_at_id_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # ?created_by= and ?updated_after=/?updated_before= on the book list.
+            models.Index(
+                fields=['created_by', '-created_at', '-id'],
+                name='book_created_by_created_at_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['updated_at'],
+                name='book_updated_at_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # Full-text search on ?q= and typo-tolerant / icontains lookups on
+            # title and author. Django compares UPPER(column) for icontains, so
+            # the trigram indexes are built on the same expression.
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='book_title_trgm_idx'),
+            GinIndex(OpClass(Upper('author'), name='gin_trgm_ops'), name='book_author_trgm_idx'),
+            # Serve the most favorited feed.
+            models.Index(
+                fields=['-favorite_count', '-id'],
+                name='book_favorite_count_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # Serve the top books leaderboard straight off an index, overall and per author.
+            models.Index(
+                fields=['-weighted_rating', 'id'],
+                name='book_weighted_rating_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['author', '-weighted_rating', 'id'],
+                name='book_author_rating_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def soft_delete(self):
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['is_deleted', 'deleted_at'])
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
+
+    def set_rating_histogram(self, histogram):
+        self.rating_histogram = list(histogram)
+        self.rating_count = sum(self.rating_histogram)
+        self.rating_sum = sum(star * total for star, total in zip(RATING_SCALE, self.rating_histogram))
+
+    def apply_rating_change(self, added=(), removed=()):
+        histogram = list(self.rating_histogram or empty_rating_histogram())
+        for rating in added:
+            histogram[rating] += 1
+        for rating in removed:
+            histogram[rating] = max(histogram[rating] - 1, 0)
+        self.set_rating_histogram(histogram)
+
+class FavoriteManager(models.Manager):
+    def add_many(self, user, book_ids):
+        # INSERT ... ON CONFLICT DO NOTHING RETURNING tells us which rows this
+        # call created, so counters only move for favorites that are really new.
+        if not book_ids:
+            return set()
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, book_id) SELECT %s, unnest(%s::bigint[]) '
+                f'ON CONFLICT (user_id, book_id) DO NOTHING RETURNING book_id',
+                [user.pk, list(book_ids)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def remove_many(self, user, book_ids):
+        # Locking first means a concurrent request removing the same rows waits
+        # and then finds nothing, instead of both decrementing the counters.
+        if not book_ids:
+            return set()
+        removed = set(
+            self.select_for_update().filter(user=user, book_id__in=book_ids).values_list('book_id', flat=True)
+        )
+        if removed:
+            self.filter(user=user, book_id__in=removed).delete()
+        return removed
+
+
+class LiveFavoriteManager(FavoriteManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(book__is_deleted=False)
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
 
+    # Favorites of soft-deleted books are kept until the book is purged but
+    # hidden from reads, like the books themselves.
+    objects = LiveFavoriteManager()
+    all_objects = FavoriteManager()
+
     class Meta:
         unique_together = ('user', 'book')
+        indexes = [
+            # Pages a user's favorites newest first without sorting them all.
+            models.Index(fields=['user', '-id'], name='favorite_user_id_idx'),
+        ]
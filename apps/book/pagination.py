@@ -0,0 +1,18 @@
+from config.pagination import KeysetPagination
+
+
+class BookPagination(KeysetPagination):
+
+    def get_ordering(self, request, queryset, view):
+        # ?q= searches are returned best match first.
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class FavoritePagination(KeysetPagination):
+    ordering = ('-id',)
+
+
+class PopularPagination(KeysetPagination):
+    ordering = ('-favorite_count', '-id')
@@ -14,13 +14,39 @@ class FavoriteSerializer(serializers.ModelSerializer):
         validated_data['user'] = request.user
         return super().create(validated_data)
 
+class BookSummarySerializer(serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'author', 'average_rating']
+
+class FavoriteListSerializer(serializers.ModelSerializer):
+    book = BookSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Favorite
+        fields = ['id', 'book']
+
+class BulkFavoriteSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list, max_length=500)
+    remove = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list, max_length=500)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError("Provide book ids to 'add' and/or 'remove'.")
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError("A book can't be both added and removed.")
+        return data
+
 class BookModelSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.email')
 
     class Meta:
         model=Book
-        fields = ['id','title', 'author', 'description', 'created_by','is_deleted']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['id','title', 'author', 'description', 'created_by','is_deleted', 'favorite_count']
+        # Deletion only goes through DELETE, which stamps deleted_at for the purge.
+        read_only_fields = ['is_deleted', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         request = self.context.get('request')
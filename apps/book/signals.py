@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.book.models import Book
+from config.caching import invalidate_model
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed(sender, **kwargs):
+    # Covers create, update and the soft delete in BookViewSet.perform_destroy.
+    invalidate_model(Book)
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from apps.book.models import Book, Favorite
+from apps.review.models import Opinion
+from config.caching import invalidate_model
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def purge_deleted_books_task(batch_size=None):
+    # Hard-deletes tombstones past the retention period, with their reviews and
+    # favorites, in short transactions so the purge never holds long locks.
+    batch_size = batch_size or settings.BOOK_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.BOOK_TOMBSTONE_RETENTION_DAYS)
+    # Tombstones without deleted_at (flagged by a direct write rather than
+    # soft_delete) age from their last update instead.
+    expired = Q(deleted_at__lt=cutoff) | Q(deleted_at__isnull=True, updated_at__lt=cutoff)
+    purged = 0
+    while True:
+        with transaction.atomic():
+            # Locked so a book restored mid-batch keeps its reviews and favorites.
+            ids = list(
+                Book.all_objects.filter(expired, is_deleted=True)
+                .order_by('deleted_at')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Opinion and Book have post_delete receivers, so delete() would load
+            # every row and send a signal per review; delete children first in
+            # single statements and invalidate the caches once per batch instead.
+            Opinion.all_objects.filter(book_id__in=ids)._raw_delete(Opinion.all_objects.db)
+            Favorite.all_objects.filter(book_id__in=ids).delete()
+            Book.all_objects.filter(id__in=ids)._raw_delete(Book.all_objects.db)
+            invalidate_model(Opinion)
+            invalidate_model(Book)
+        purged += len(ids)
+    logger.info(f"Purged {purged} deleted books older than {cutoff:%Y-%m-%d}")
+    return purged
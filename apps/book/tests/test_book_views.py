@@ -1,10 +1,22 @@
+import csv
+import json
+from io import StringIO
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.db.models import Avg
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 from apps.book.models import Book, Favorite
 from apps.book.serializers import BookModelSerializer
 
 from apps.book.tests.factories import BookFactory, FavoriteFactory
+from apps.review.tests.factories import OpinionFactory
 from apps.user.tests.factories import UserFactory
 from config.test_case import ApiTestCase
 
@@ -114,6 +126,39 @@ class TestBookViews(ApiTestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)       
         book.refresh_from_db()
         self.assertTrue(book.is_deleted)
+        self.assertIsNotNone(book.deleted_at)
+
+    def test_update_cannot_set_is_deleted(self):
+        """
+        Test is_deleted is read-only, so deletion always goes through soft_delete.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(f'/book/{self.book.id}/', {'is_deleted': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_deleted'])
+        self.assertTrue(Book.objects.filter(pk=self.book.pk).exists())
+
+    def test_deleted_books_hidden_from_reads(self):
+        """
+        Test soft-deleted books and their favorites are hidden by the default managers.
+        """
+        deleted = BookFactory(is_deleted=True)
+        FavoriteFactory(user=self.user, book=deleted)
+        self.assertFalse(Book.objects.filter(id=deleted.id).exists())
+        self.assertTrue(Book.all_objects.filter(id=deleted.id).exists())
+        self.assertFalse(Favorite.objects.filter(book=deleted).exists())
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/review/', {'book': deleted.id, 'rating': 4, 'comment': 'c'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/book/bulk_favorites/', {'remove': [deleted.id]}, format='json')
+        self.assertEqual(response.data['results'], [{'id': deleted.id, 'status': 'not_found'}])
+
+        self.client.force_login(self.super_user)
+        response = self.client.get('/admin/book/book/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotContains(response, f'/admin/book/book/{deleted.id}/change/')
+        self.assertContains(response, f'/admin/book/book/{self.book.id}/change/')
 
     def test_destroy_book_by_another_user(self):
         """
@@ -153,6 +198,169 @@ class TestBookViews(ApiTestCase):
         self.assertFalse(Favorite.objects.filter(user=user, book=book).exists())
 
 
+    def test_bulk_favorites(self):
+        """
+        Test adding and removing many favorites at once with a status per id.
+        """
+        user = self.user
+        new_book, already, favorite_to_remove, not_favorite = BookFactory.create_batch(4)
+        deleted = BookFactory(is_deleted=True)
+        FavoriteFactory(user=user, book=already)
+        FavoriteFactory(user=user, book=favorite_to_remove)
+        self.client.force_authenticate(user=user)
+
+        data = {
+            'add': [new_book.id, already.id, deleted.id, 999999],
+            'remove': [favorite_to_remove.id, not_favorite.id],
+        }
+        response = self.client.post('/book/bulk_favorites/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {result['id']: result['status'] for result in response.data['results']},
+            {
+                new_book.id: 'added',
+                already.id: 'already_favorite',
+                deleted.id: 'not_found',
+                999999: 'not_found',
+                favorite_to_remove.id: 'removed',
+                not_favorite.id: 'not_favorite',
+            },
+        )
+        self.assertEqual(
+            set(Favorite.objects.filter(user=user).values_list('book_id', flat=True)),
+            {new_book.id, already.id},
+        )
+
+    def test_favorite_counts(self):
+        """
+        Test the favorite endpoints keep the book's favorite count in step.
+        """
+        book, other_book = BookFactory.create_batch(2)
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f'/book/{book.id}/favorite/')
+        self.client.post(f'/book/{book.id}/favorite/')
+        self.client.post('/book/bulk_favorites/', {'add': [other_book.id]}, format='json')
+        self.client.force_authenticate(user=self.super_user)
+        self.client.post('/book/bulk_favorites/', {'add': [book.id, other_book.id]}, format='json')
+        self.client.post(f'/book/{other_book.id}/unfavorite/')
+        book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(book.favorite_count, 2)
+        self.assertEqual(other_book.favorite_count, 1)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/book/bulk_favorites/', {'remove': [book.id, other_book.id]}, format='json')
+        book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(book.favorite_count, 1)
+        self.assertEqual(other_book.favorite_count, 0)
+
+    def test_popular_books(self):
+        """
+        Test the popular feed orders books by favorite count and skips deleted books.
+        """
+        most = BookFactory(favorite_count=5)
+        BookFactory(favorite_count=9, is_deleted=True)
+        second = BookFactory(favorite_count=3)
+        third = BookFactory(favorite_count=3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/book/popular/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        response = self.client.get(response.data['next'])
+        results += response.data['results']
+        self.assertEqual([book['id'] for book in results[:3]], [most.id, third.id, second.id])
+        self.assertEqual(results[0]['favorite_count'], 5)
+
+    def test_reconcile_favorite_counts(self):
+        """
+        Test the reconcile command recounts drifted favorite counts.
+        """
+        FavoriteFactory.create_batch(2, book=self.book)
+        drifted = BookFactory(favorite_count=4)
+        call_command('reconcile_favorite_counts', batch_size=1)
+        self.book.refresh_from_db()
+        drifted.refresh_from_db()
+        self.assertEqual(self.book.favorite_count, 2)
+        self.assertEqual(drifted.favorite_count, 0)
+
+    def test_reconcile_favorite_counts_of_deleted_book(self):
+        """
+        Test the reconcile command also repairs soft-deleted books.
+        """
+        tombstone = BookFactory(favorite_count=7)
+        tombstone.soft_delete()
+        call_command('reconcile_favorite_counts')
+        self.assertEqual(Book.all_objects.get(pk=tombstone.pk).favorite_count, 0)
+
+    def test_bulk_favorites_counts_only_rows_written(self):
+        """
+        Test a repeated bulk request (e.g. a client retry) moves favorite counts only once.
+        """
+        book, other = BookFactory.create_batch(2)
+        self.client.force_authenticate(user=self.user)
+        data = {'add': [book.id, other.id]}
+        self.client.post('/book/bulk_favorites/', data, format='json')
+        response = self.client.post('/book/bulk_favorites/', data, format='json')
+        self.assertEqual({result['status'] for result in response.data['results']}, {'already_favorite'})
+
+        data = {'remove': [book.id]}
+        self.client.post('/book/bulk_favorites/', data, format='json')
+        response = self.client.post('/book/bulk_favorites/', data, format='json')
+        self.assertEqual(response.data['results'], [{'id': book.id, 'status': 'not_favorite'}])
+        self.assertEqual(Book.objects.get(pk=book.pk).favorite_count, 0)
+        self.assertEqual(Book.objects.get(pk=other.pk).favorite_count, 1)
+
+    def test_bulk_favorites_query_count(self):
+        """
+        Test the bulk endpoint's query count doesn't grow with the number of ids.
+        """
+        self.client.force_authenticate(user=self.user)
+
+        def count_queries(books):
+            data = {'add': [book.id for book in books]}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/book/bulk_favorites/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(count_queries(BookFactory.create_batch(2)), count_queries(BookFactory.create_batch(20)))
+
+    def test_bulk_favorites_invalid(self):
+        """
+        Test a request with no ids or the same id in add and remove is rejected.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/book/bulk_favorites/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = {'add': [self.book.id], 'remove': [self.book.id]}
+        response = self.client.post('/book/bulk_favorites/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_favorites(self):
+        """
+        Test listing favorites returns book summaries, skips deleted books and
+        pages in a constant number of queries.
+        """
+        user = self.user
+        favorites = [FavoriteFactory(user=user) for _ in range(3)]
+        FavoriteFactory(user=user, book=BookFactory(is_deleted=True))
+        FavoriteFactory()
+        self.client.force_authenticate(user=user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/book/list_favorites/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        response = self.client.get(response.data['next'])
+        results += response.data['results']
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            [favorite['book']['id'] for favorite in results],
+            [favorite.book.id for favorite in reversed(favorites)],
+        )
+        self.assertEqual(results[0]['book']['title'], favorites[-1].book.title)
+
     def test_filter_by_title(self):
 
         BookFactory(title='Book One', author='Author A', description='Description A', created_by=self.user),
@@ -165,8 +373,8 @@ class TestBookViews(ApiTestCase):
         print("Request URL:", response.request['PATH_INFO'])
         print("Request parameters:", response.request['QUERY_STRING'])
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['title'], 'Book One')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['title'], 'Book One')
 
         # author
 
@@ -175,13 +383,252 @@ class TestBookViews(ApiTestCase):
         response = self.client.get(url, params, format='json')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertTrue(all(book['author'] == 'Author A' for book in response.data))
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(all(book['author'] == 'Author A' for book in response.data['results']))
+
+    def test_list_books_cursor_pagination(self):
+        """
+        Test paging through books by (created_at, id) cursor, forwards and back.
+        """
+        created_at = timezone.now()
+        BookFactory.create_batch(4, created_at=created_at)
+        expected = list(
+            Book.objects.filter(is_deleted=False).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+        response = self.client.get('/book/', {'page_size': 2})
+        self.assertIsNone(response.data['previous'])
+        pages = [[book['id'] for book in response.data['results']]]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append([book['id'] for book in response.data['results']])
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([book['id'] for book in response.data['results']], pages[-2])
+
+    def test_search_books_ranked(self):
+        """
+        Test ?q= ranks title matches above author and description matches.
+        """
+        in_description = BookFactory(title='Cooking', author='Someone', description='A history of gardens')
+        in_title = BookFactory(title='Gardens of the world', author='Someone', description='Plants')
+        in_author = BookFactory(title='Essays', author='Maria Garden', description='Short pieces')
+        response = self.client.get('/book/', {'q': 'garden'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book['id'] for book in response.data['results']],
+            [in_title.id, in_author.id, in_description.id],
+        )
 
+    def test_search_books_typo(self):
+        """
+        Test ?q= still finds a title from a misspelt word or a prefix.
+        """
+        book = BookFactory(title='Mastering Django', description='Web development')
+        for query in ['masterring', 'djang']:
+            response = self.client.get('/book/', {'q': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn(book.id, [result['id'] for result in response.data['results']])
+
+    def test_list_books_query_count(self):
+        """
+        Test the book list doesn't run a query per book for created_by.
+        """
+        def count_list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/book/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        BookFactory.create_batch(2)
+        few = count_list_queries()
+        BookFactory.create_batch(8)
+        self.assertEqual(count_list_queries(), few)
+        self.assertEqual(few, 1)
+
+    def test_retrieve_book_query_count(self):
+        """
+        Test retrieving a book with its owner's email is a single query.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/book/{self.book.id}/')
+        self.assertEqual(response.data['created_by'], self.user.email)
+
+    def test_list_books_invalid_cursor(self):
+        """
+        Test a malformed cursor is rejected.
+        """
+        response = self.client.get('/book/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+
+
+
+
+
+
+
+
+class TestBookResponseCache(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_list_and_retrieve_cached(self):
+        """
+        Test repeated list and retrieve requests are served without queries,
+        whatever the order of the query params.
+        """
+        self.client.get('/book/', {'author': self.book.author, 'page_size': 5})
+        self.client.get(f'/book/{self.book.id}/')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/book/?page_size=5&author={self.book.author}')
+            self.assertEqual([book['id'] for book in response.data['results']], [self.book.id])
+            response = self.client.get(f'/book/{self.book.id}/')
+            self.assertEqual(response.data['title'], self.book.title)
+
+    def test_writes_invalidate_cache(self):
+        """
+        Test creating, updating, deleting and favoriting books drop cached responses.
+        """
+        def list_titles():
+            return {book['title']: book for book in self.client.get('/book/').data['results']}
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(set(list_titles()), {self.book.title})
+
+        self.client.post('/book/', {'title': 'New', 'author': 'A', 'description': 'D'}, format='json')
+        self.assertEqual(set(list_titles()), {self.book.title, 'New'})
+
+        self.client.patch(f'/book/{self.book.id}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(set(list_titles()), {'Renamed', 'New'})
 
+        self.client.post(f'/book/{self.book.id}/favorite/')
+        self.assertEqual(list_titles()['Renamed']['favorite_count'], 1)
 
+        self.client.delete(f'/book/{self.book.id}/')
+        self.assertEqual(set(list_titles()), {'New'})
+        response = self.client.get(f'/book/{self.book.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class TestAsyncBookViews(ApiTestCase):
 
+    def setUp(self):
+        super().setUp()
+        cache.clear()
 
+    def test_async_list_matches_sync(self):
+        """
+        Test the async book list returns the same filtered page as the sync one.
+        """
+        BookFactory.create_batch(3, author='Async Author')
+        params = {'author': 'Async Author', 'page_size': 2}
+        sync = self.client.get('/book/', params).json()
+        response = self.client.get('/book/async/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['results'], sync['results'])
+        response = self.client.get(data['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_async_detail(self):
+        """
+        Test the async book detail matches the sync one and hides deleted books.
+        """
+        response = self.client.get(f'/book/async/{self.book.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(f'/book/{self.book.id}/').json())
+        deleted = BookFactory(is_deleted=True)
+        response = self.client.get(f'/book/async/{deleted.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_list_cached_and_invalidated(self):
+        """
+        Test the async list is served from the cache until a book changes.
+        """
+        self.client.get('/book/async/')
+        with self.assertNumQueries(0):
+            self.client.get('/book/async/')
+        BookFactory(title='Fresh')
+        titles = [book['title'] for book in self.client.get('/book/async/').json()['results']]
+        self.assertIn('Fresh', titles)
+
+
+class TestExports(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def test_export_books_ndjson(self):
+        """
+        Test books stream as NDJSON in id order, filtered and without deleted books.
+        """
+        books = BookFactory.create_batch(3, author='Exported Author')
+        BookFactory(author='Exported Author', is_deleted=True)
+        response = self.client.get('/book/export/', {'author': 'Exported Author'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [book.id for book in books])
+        self.assertEqual(rows[0]['created_by'], books[0].created_by.email)
+
+    def test_export_books_csv(self):
+        """
+        Test books stream as CSV with a header row.
+        """
+        response = self.client.get('/book/export/', {'output': 'csv'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'author'])
+        self.assertEqual(rows[1][:2], [str(self.book.id), self.book.title])
+
+    def test_export_books_asgi(self):
+        """
+        Test the export streams through the ASGI handler with an async iterator.
+        """
+        books = BookFactory.create_batch(3, author='Async Exported')
+        token = self.authenticate(self.user)
+
+        async def export():
+            response = await AsyncClient().get(
+                '/book/export/', {'author': 'Async Exported', 'output': 'csv'},
+                headers={'authorization': f'Token {token.key}'},
+            )
+            return response, [chunk async for chunk in response.streaming_content]
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response, chunks = async_to_sync(export)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(chunks), 2)
+        rows = list(csv.reader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['id', 'title'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [book.id for book in books])
+
+    def test_export_invalid_format(self):
+        """
+        Test an unknown export format is rejected.
+        """
+        response = self.client.get('/book/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_reviews(self):
+        """
+        Test reviews stream through the API and the export_data command.
+        """
+        opinions = OpinionFactory.create_batch(3, book=self.book)
+        response = self.client.get('/review/export/', {'book': self.book.id})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [opinion.id for opinion in opinions])
 
+        out = StringIO()
+        call_command('export_data', 'reviews', output_format='csv', chunk_size=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id,book,user,rating,comment,created_at')
+        self.assertEqual(len(lines), 4)
@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from apps.book.models import Book
+from apps.user.tests.factories import UserFactory
+
+CATALOGUE_SIZE = 95
+
+
+class GoogleBooksStub(BaseHTTPRequestHandler):
+    requests_seen = []
+    author = 'Stub Author'
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        start = int(params['startIndex'][0])
+        count = int(params['maxResults'][0])
+        GoogleBooksStub.requests_seen.append((params['q'][0], start, count))
+        items = [
+            {
+                'id': f"{params['q'][0]}-{index}",
+                'volumeInfo': {'title': f"{params['q'][0]} {index}", 'authors': [GoogleBooksStub.author], 'description': 'Stub'},
+            }
+            for index in range(start, min(start + count, CATALOGUE_SIZE))
+        ]
+        body = json.dumps({'items': items} if items else {}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FetchBooksCommandTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), GoogleBooksStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/volumes'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        GoogleBooksStub.requests_seen = []
+        GoogleBooksStub.author = 'Stub Author'
+        self.owner = UserFactory()
+
+    def test_fetch_books_pages_queries(self):
+        """
+        Test every page of every query is fetched and inserted for the owner.
+        """
+        out = StringIO()
+        call_command(
+            'fetch_books', 'django', 'python', limit=90, batch_size=25,
+            owner=self.owner.email, base_url=self.base_url, stdout=out,
+        )
+        self.assertEqual(Book.objects.filter(created_by=self.owner).count(), 180)
+        self.assertEqual(
+            sorted(GoogleBooksStub.requests_seen),
+            sorted((query, start, count) for query in ['django', 'python'] for start, count in [(0, 40), (40, 40), (80, 10)]),
+        )
+        self.assertIn('items/sec', out.getvalue())
+
+    def test_fetch_books_stops_at_end_of_results(self):
+        """
+        Test a limit past the end of the results imports what exists.
+        """
+        call_command('fetch_books', 'django', limit=200, owner=str(self.owner.id), base_url=self.base_url, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), CATALOGUE_SIZE)
+
+    def test_fetch_books_reimport_updates_in_place(self):
+        """
+        Test importing the same volumes again updates rows instead of duplicating them.
+        """
+        options = {'limit': 50, 'owner': self.owner.email, 'base_url': self.base_url, 'stdout': StringIO()}
+        call_command('fetch_books', 'django', 'django', **options)
+        self.assertEqual(Book.objects.count(), 50)
+
+        GoogleBooksStub.author = 'Renamed Author'
+        call_command('fetch_books', 'django', **options)
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertFalse(Book.objects.exclude(author='Renamed Author').exists())
+        self.assertTrue(Book.objects.filter(source='google_books', external_id='django-0').exists())
+
+    def test_fetch_books_unknown_owner(self):
+        """
+        Test the command fails up front when the owner doesn't exist.
+        """
+        with self.assertRaises(CommandError):
+            call_command('fetch_books', owner='nobody@example.com', base_url=self.base_url, stdout=StringIO())
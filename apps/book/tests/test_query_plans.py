@@ -0,0 +1,74 @@
+from datetime import timedelta
+from django.utils import timezone
+from apps.book.filters import BookFilter
+from apps.book.models import Book, Favorite
+from apps.book.pagination import BookPagination
+from apps.book.views import BookViewSet
+from apps.user.models import CustomUser
+from config.test_case import QueryPlanTestCase
+
+PAGE = 21
+
+
+class TestBookQueryPlans(QueryPlanTestCase):
+
+    def book_list(self, params):
+        # The queryset BookViewSet.list runs: filterset, then keyset ordering.
+        queryset = BookFilter(params, queryset=BookViewSet.queryset.all()).qs
+        ordering = BookPagination().get_ordering(None, queryset, None)
+        return queryset.order_by(*ordering)[:PAGE]
+
+    def test_book_list_filters_use_indexes(self):
+        """
+        Test every documented book list filter combination is served by an index.
+        """
+        user = CustomUser.objects.filter(email='plan-7@example.com').get()
+        week_ago = (timezone.now() - timedelta(days=7)).date()
+        month_ago = (timezone.now() - timedelta(days=30)).date()
+        combinations = {
+            'no filters': {},
+            'title': {'title': self.words[3][:5]},
+            'author': {'author': 'Author 12'},
+            'created_by': {'created_by': user.id},
+            'user': {'user': user.id},
+            'created_at range': {'created_at_after': month_ago, 'created_at_before': week_ago},
+            'updated_at range': {'updated_at_after': month_ago, 'updated_at_before': week_ago},
+            'created_by and created_at range': {'created_by': user.id, 'created_at_after': month_ago},
+            'title and author': {'title': self.words[4], 'author': 'Author 3'},
+            'search': {'q': self.words[5]},
+            'search two words': {'q': f'{self.words[6]} {self.words[7]}'},
+        }
+        for label, params in combinations.items():
+            with self.subTest(label):
+                self.assertNoSeqScan(self.book_list(params), label)
+
+    def test_book_list_next_page_uses_index(self):
+        """
+        Test a keyset page deep into the list is a range scan.
+        """
+        book = Book.objects.filter(is_deleted=False).order_by('-created_at', '-id')[5000]
+        pagination = BookPagination()
+        ordering = pagination.ordering
+        queryset = (
+            BookViewSet.queryset.filter(pagination.position_filter(ordering, [book.created_at, book.id]))
+            .order_by(*ordering)[:PAGE]
+        )
+        self.assertNoSeqScan(queryset, 'next page')
+
+    def test_book_feeds_use_indexes(self):
+        """
+        Test the popular, top books, average ratings and favorites reads use indexes.
+        """
+        user = CustomUser.objects.filter(email='plan-7@example.com').get()
+        live = Book.objects.filter(is_deleted=False)
+        queries = {
+            'retrieve': BookViewSet.queryset.filter(pk=Book.objects.order_by('id')[100].id),
+            'popular': BookViewSet.queryset.order_by('-favorite_count', '-id')[:PAGE],
+            'top books': live.filter(rating_count__gt=0).order_by('-weighted_rating', 'id')[:10],
+            'top books by author': live.filter(rating_count__gt=0, author='Author 12').order_by('-weighted_rating', 'id')[:10],
+            'average ratings': live.order_by('id')[:51],
+            'list favorites': Favorite.objects.filter(user=user, book__is_deleted=False).order_by('-id')[:PAGE],
+        }
+        for label, queryset in queries.items():
+            with self.subTest(label):
+                self.assertNoSeqScan(queryset, label)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from apps.book.models import Book, Favorite
+from apps.book.tasks import purge_deleted_books_task
+from apps.book.tests.factories import BookFactory, FavoriteFactory
+from apps.review.models import Opinion
+from apps.review.tests.factories import OpinionFactory
+from config.test_case import ApiTestCase
+
+
+@override_settings(BOOK_TOMBSTONE_RETENTION_DAYS=30)
+class PurgeDeletedBooksTests(ApiTestCase):
+
+    def test_purges_expired_tombstones_in_batches(self):
+        """
+        Test tombstones past retention are hard-deleted with their reviews and
+        favorites, while recent tombstones and live books are kept.
+        """
+        expired = BookFactory.create_batch(3, is_deleted=True, deleted_at=timezone.now() - timedelta(days=31))
+        recent = BookFactory(is_deleted=True, deleted_at=timezone.now() - timedelta(days=1))
+        OpinionFactory(book=expired[0])
+        FavoriteFactory(book=expired[1])
+
+        self.assertEqual(purge_deleted_books_task(batch_size=2), 3)
+        self.assertEqual(
+            set(Book.all_objects.values_list('id', flat=True)),
+            {self.book.id, recent.id},
+        )
+        self.assertFalse(Opinion.all_objects.filter(book_id=expired[0].id).exists())
+        self.assertFalse(Favorite.all_objects.filter(book_id=expired[1].id).exists())
+
+    def test_purges_tombstones_without_deleted_at(self):
+        """
+        Test tombstones missing deleted_at age from updated_at instead of lingering forever.
+        """
+        old, recent = BookFactory.create_batch(2, is_deleted=True)
+        Book.all_objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=31))
+
+        self.assertEqual(purge_deleted_books_task(), 1)
+        self.assertEqual(set(Book.all_objects.values_list('id', flat=True)), {self.book.id, recent.id})
@@ -1,9 +1,13 @@
 from django.urls import path
 from rest_framework import routers
 
-from .views import  BookViewSet
+from .views import  BookViewSet, book_detail_async, book_list_async
 
 router = routers.DefaultRouter()
 router.register(r"", BookViewSet,)
-urlpatterns= router.urls
+# Ahead of the router, whose detail route would otherwise match 'async'.
+urlpatterns = [
+    path('async/', book_list_async, name='book-list-async'),
+    path('async/<int:pk>/', book_detail_async, name='book-detail-async'),
+] + router.urls
 
@@ -1,19 +1,49 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import  status, viewsets, permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
 from .models import Book, Favorite
-from .serializers import BookModelSerializer, FavoriteSerializer
+from .serializers import BookModelSerializer, BulkFavoriteSerializer, FavoriteListSerializer
 from .permissions import IsOwner
 from .filters import BookFilter
+from .pagination import BookPagination, FavoritePagination, PopularPagination
+from config.caching import CachedResponseMixin, aget_generations, response_cache_key
+from config.exports import get_export_format, streaming_export_response
 
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.filter(is_deleted=False)
+# (column, lookup) pairs streamed by the book export.
+BOOK_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('author', 'author'),
+    ('description', 'description'),
+    ('created_by', 'created_by__email'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('rating_count', 'rating_count'),
+    ('rating_sum', 'rating_sum'),
+    ('favorite_count', 'favorite_count'),
+]
+
+
+class BookViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Book.objects.select_related('created_by').only(
+        'id', 'title', 'author', 'description', 'is_deleted', 'created_at', 'updated_at', 'favorite_count',
+        'created_by__email',
+    )
     serializer_class = BookModelSerializer 
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwner]
     filter_backends = [DjangoFilterBackend]
     filterset_class = BookFilter
+    pagination_class = BookPagination
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -24,8 +54,7 @@ class BookViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     def perform_destroy(self, instance):
-        instance.is_deleted=True
-        instance.save(update_fields=['is_deleted'])
+        instance.soft_delete()
 
     @action(
         detail=True,
@@ -39,7 +68,10 @@ class BookViewSet(viewsets.ModelViewSet):
             book = queryset.get(pk=pk)
         except Book.DoesNotExist:
             return Response({'status': 'Book not found or has been deleted'}, status=status.HTTP_404_NOT_FOUND) 
-        favorite, created = Favorite.objects.get_or_create(user=request.user, book=book)
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(user=request.user, book=book)
+            if created:
+                Book.objects.adjust_favorite_counts([book.id], 1)
         if created:
             return Response({'status': 'Book marked as favorite'}, status=status.HTTP_201_CREATED)
         return Response({'status': 'Book already marked as favorite'}, status=status.HTTP_200_OK)
@@ -47,20 +79,109 @@ class BookViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unfavorite(self, request, pk=None):
         book = self.get_object()
-        try:
-            favorite = Favorite.objects.get(user=request.user, book=book)
-            favorite.delete()
+        with transaction.atomic():
+            deleted, _ = Favorite.objects.filter(user=request.user, book=book).delete()
+            if deleted:
+                Book.objects.adjust_favorite_counts([book.id], -1)
+        if deleted:
             return Response({'status': 'Book unmarked as favorite'}, status=status.HTTP_204_NO_CONTENT)
-        except Favorite.DoesNotExist:
-            return Response({'status': 'Book was not marked as favorite'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'Book was not marked as favorite'}, status=status.HTTP_400_BAD_REQUEST)
         
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_favorites(self, request):
+        serializer = BulkFavoriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add_ids = list(dict.fromkeys(serializer.validated_data['add']))
+        remove_ids = list(dict.fromkeys(serializer.validated_data['remove']))
+
+        # One query validates every id; the writes then report which rows they
+        # actually changed, so overlapping requests (e.g. retries) can't
+        # double-count.
+        found = set(Book.objects.filter(id__in=add_ids + remove_ids).values_list('id', flat=True))
+        with transaction.atomic():
+            added = Favorite.all_objects.add_many(request.user, [book_id for book_id in add_ids if book_id in found])
+            removed = Favorite.all_objects.remove_many(
+                request.user, [book_id for book_id in remove_ids if book_id in found]
+            )
+            Book.objects.adjust_favorite_counts(sorted(added), 1)
+            Book.objects.adjust_favorite_counts(sorted(removed), -1)
+
+        results = {}
+        for book_id in add_ids:
+            if book_id not in found:
+                results[book_id] = 'not_found'
+            else:
+                results[book_id] = 'added' if book_id in added else 'already_favorite'
+        for book_id in remove_ids:
+            if book_id not in found:
+                results[book_id] = 'not_found'
+            else:
+                results[book_id] = 'removed' if book_id in removed else 'not_favorite'
+        return Response(
+            {'results': [{'id': book_id, 'status': result} for book_id, result in results.items()]},
+            status=status.HTTP_200_OK,
+        )
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        # Streams every live book matching the list filters as ?output=ndjson|csv.
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        return streaming_export_response(request, queryset, BOOK_EXPORT_FIELDS, export_format, 'books')
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny], pagination_class=PopularPagination)
+    def popular(self, request):
+        # Most favorited first, read off book_favorite_count_idx.
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], pagination_class=FavoritePagination)
     def list_favorites(self, request):
-        favorites = Favorite.objects.filter(user=request.user) #TODO
-        serializer = FavoriteSerializer(many=True) 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        favorites = Favorite.objects.filter(user=request.user).select_related('book').only(
+            'id', 'book__id', 'book__title', 'book__author', 'book__rating_count', 'book__rating_sum',
+        )
+        page = self.paginate_queryset(favorites)
+        serializer = FavoriteListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     def get_permissions(self):
         if self.action == 'list':
             return [permissions.AllowAny()]
-        return super().get_permissions()
\ No newline at end of file
+        return super().get_permissions()
+
+
+# Async twins of BookViewSet.list and retrieve for ASGI deployments: same
+# filters, pagination, payload and cache invalidation, without holding a
+# worker thread while waiting on the cache or the database.
+
+@require_GET
+async def book_list_async(request):
+    key = response_cache_key(request, 'book-async:list', await aget_generations([Book]))
+    data = await cache.aget(key)
+    if data is None:
+        filterset = BookFilter(request.GET, queryset=BookViewSet.queryset.all())
+        if not filterset.is_valid():
+            return JsonResponse(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        paginator = BookPagination()
+        try:
+            page = await paginator.apaginate_queryset(filterset.qs, Request(request))
+        except NotFound as e:
+            return JsonResponse({'detail': e.detail}, status=status.HTTP_404_NOT_FOUND)
+        data = paginator.get_paginated_data(BookModelSerializer(page, many=True).data)
+        await cache.aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return JsonResponse(data, encoder=JSONEncoder)
+
+
+@require_GET
+async def book_detail_async(request, pk):
+    key = response_cache_key(request, 'book-async:detail', await aget_generations([Book]))
+    data = await cache.aget(key)
+    if data is None:
+        try:
+            book = await BookViewSet.queryset.aget(pk=pk)
+        except Book.DoesNotExist:
+            return JsonResponse({'detail': 'No Book matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        data = BookModelSerializer(book).data
+        await cache.aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return JsonResponse(data, encoder=JSONEncoder)
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from apps.review.views import ReviewViewSet
+
+
+class CountingReviewViewSet(ReviewViewSet):
+    # Counts page rebuilds and sleeps --compute-latency to stand in for a
+    # catalogue large enough that rebuilding a page is expensive.
+    compute_latency = 0
+    computations = 0
+    counter_lock = threading.Lock()
+
+    def compute_average_ratings(self, request):
+        with CountingReviewViewSet.counter_lock:
+            CountingReviewViewSet.computations += 1
+        time.sleep(self.compute_latency)
+        return super().compute_average_ratings(request)
+
+
+class Command(BaseCommand):
+    help = 'Fires concurrent requests at /review/average_ratings/ and counts how many recompute the page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--compute-latency', type=float, default=200, help='Extra cost of a rebuild in ms')
+
+    def handle(self, *args, **options):
+        CountingReviewViewSet.compute_latency = options['compute_latency'] / 1000
+        # Pass the @action options (permissions, pagination) the router would.
+        view = CountingReviewViewSet.as_view(
+            {'get': 'average_ratings'}, detail=False, basename='review', **ReviewViewSet.average_ratings.kwargs
+        )
+        factory = APIRequestFactory()
+        params = {'page_size': options['page_size']}
+
+        def request(_):
+            try:
+                started = time.perf_counter()
+                response = view(factory.get('/review/average_ratings/', params))
+                assert response.status_code == 200, response.status_code
+                return time.perf_counter() - started
+            finally:
+                connection.close()
+
+        def run(label):
+            CountingReviewViewSet.computations = 0
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                latencies = sorted(executor.map(request, range(options['concurrency'])))
+            self.stdout.write(
+                f"{label}: {options['concurrency']} concurrent requests, "
+                f"{CountingReviewViewSet.computations} recomputations, "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, max {latencies[-1] * 1000:.0f}ms"
+            )
+
+        with override_settings(AVERAGE_RATINGS_CACHE_TIMEOUT=1):
+            cache.delete_pattern('average_ratings:*')
+            run('cold miss')
+            time.sleep(1.1)
+            run('expired (stale-while-revalidate)')
+            run('fresh')
@@ -0,0 +1,56 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.review.models import Opinion
+from apps.review.serializers import validate_review_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def read_rows(handle, input_format):
+    # Rows are read lazily so the file is never held in memory at once.
+    if input_format == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    for number, line in enumerate(handle, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise CommandError(f'Line {number} is not valid JSON.')
+
+
+class Command(BaseCommand):
+    help = 'Loads reviews from an NDJSON or CSV file with book, user, rating and comment columns, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input-format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=settings.REVIEW_INGEST_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        input_format = options['input_format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        started = time.perf_counter()
+        totals = {}
+        rows_read = 0
+        with open(options['path'], newline='') as handle:
+            items = read_rows(handle, input_format)
+            while batch := list(islice(items, options['batch_size'])):
+                rows, _, errors = validate_review_rows(batch)
+                statuses = Opinion.objects.bulk_ingest(rows) if rows else []
+                for result in statuses + [error['status'] for error in errors]:
+                    totals[result] = totals.get(result, 0) + 1
+                rows_read += len(batch)
+                logger.info(f"Ingested {rows_read} review rows")
+
+        elapsed = time.perf_counter() - started
+        rate = rows_read / elapsed if elapsed else 0
+        summary = ', '.join(f'{count} {result}' for result, count in sorted(totals.items())) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {rows_read} rows in {elapsed:.2f}s ({rate:.0f} rows/sec): {summary}'
+        ))
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_created_at_id_index'),
+        ('review', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opinion',
+            index=models.Index(fields=['-created_at', '-id'], name='opinion_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0009_filter_indexes'),
+        ('review', '0002_created_at_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opinion',
+            index=models.Index(fields=['book', '-created_at', '-id'], name='opinion_book_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opinion',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='opinion_user_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opinion',
+            index=models.Index(fields=['rating', '-created_at', '-id'], name='opinion_rating_created_at_idx'),
+        ),
+    ]
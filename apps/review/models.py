@@ -1,8 +1,64 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.core.validators import MaxValueValidator, MinValueValidator
 
-from apps.book.models import Book
+from apps.book.models import Book, RATING_AGGREGATE_FIELDS
+from apps.review.tasks import refresh_book_ranking_task
 from apps.user.models import CustomUser 
+from config.caching import invalidate_model
+
+
+class OpinionManager(models.Manager):
+    def bulk_ingest(self, rows):
+        # rows are validated dicts of book_id, user_id, rating and comment.
+        # Returns a status per row; the batch costs a fixed number of queries
+        # however many rows it has.
+        book_ids = {row['book_id'] for row in rows}
+        user_ids = {row['user_id'] for row in rows}
+        statuses = []
+        with transaction.atomic():
+            # Lock the books in id order, like ReviewViewSet, so concurrent
+            # reviews can't interleave with the aggregate update below.
+            books = {
+                book.id: book
+                for book in Book.objects.select_for_update().filter(id__in=book_ids).order_by('id')
+                .only('id', *RATING_AGGREGATE_FIELDS)
+            }
+            users = set(CustomUser.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            taken = set(self.filter(book_id__in=books, user_id__in=users).values_list('book_id', 'user_id'))
+
+            opinions = []
+            added = defaultdict(list)
+            for row in rows:
+                if row['book_id'] not in books:
+                    statuses.append('book_not_found')
+                elif row['user_id'] not in users:
+                    statuses.append('user_not_found')
+                elif (row['book_id'], row['user_id']) in taken:
+                    statuses.append('duplicate')
+                else:
+                    statuses.append('created')
+                    taken.add((row['book_id'], row['user_id']))
+                    opinions.append(self.model(**row))
+                    added[row['book_id']].append(row['rating'])
+
+            if opinions:
+                self.bulk_create(opinions)
+                for book_id, ratings in added.items():
+                    books[book_id].apply_rating_change(added=ratings)
+                Book.objects.bulk_update([books[book_id] for book_id in added], RATING_AGGREGATE_FIELDS)
+                # bulk_create and bulk_update send no signals.
+                invalidate_model(self.model)
+                invalidate_model(Book)
+                book_ids = sorted(added)
+                transaction.on_commit(lambda: refresh_book_ranking_task.delay(book_ids))
+        return statuses
+
+
+class LiveOpinionManager(OpinionManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(book__is_deleted=False)
 
 
 class Opinion(models.Model):
@@ -12,8 +68,20 @@ class Opinion(models.Model):
     comment = models.TextField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Reviews of soft-deleted books are hidden with the book and purged with it;
+    # all_objects still sees them, e.g. to rebuild a tombstone's aggregates.
+    objects = LiveOpinionManager()
+    all_objects = OpinionManager()
+
     class Meta:
         unique_together = ('book', 'user')
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='opinion_created_at_id_idx'),
+            # ?book=, ?user= and ?rating_min=/?rating_max= on the review list, in list order.
+            models.Index(fields=['book', '-created_at', '-id'], name='opinion_book_created_at_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='opinion_user_created_at_idx'),
+            models.Index(fields=['rating', '-created_at', '-id'], name='opinion_rating_created_at_idx'),
+        ]
 
     def __str__(self):
         return f'Review of {self.book.title} by {self.user.email}'
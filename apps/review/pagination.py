@@ -0,0 +1,8 @@
+from config.pagination import KeysetPagination
+
+
+class AverageRatingPagination(KeysetPagination):
+    # Book ids are unique and indexed, so each page is a single keyset range scan.
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 200
@@ -1,4 +1,3 @@
-from django.db.models import Avg
 from rest_framework import serializers
 
 from .models import Opinion, Book
@@ -16,25 +15,43 @@ class ReviewSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+class ReviewIngestSerializer(serializers.Serializer):
+    # Plain fields rather than related ones, so validating a row never queries;
+    # Opinion.objects.bulk_ingest resolves books and users once per batch.
+    book = serializers.IntegerField(min_value=1)
+    user = serializers.IntegerField(min_value=1)
+    rating = serializers.IntegerField(min_value=0, max_value=5)
+    comment = serializers.CharField(max_length=100)
+
+    def to_ingest_row(self):
+        data = self.validated_data
+        return {'book_id': data['book'], 'user_id': data['user'], 'rating': data['rating'], 'comment': data['comment']}
+
+
+def validate_review_rows(items):
+    # Splits raw items into ingestible rows and per-index validation errors.
+    rows, indexes, errors = [], [], []
+    for index, item in enumerate(items):
+        serializer = ReviewIngestSerializer(data=item)
+        if serializer.is_valid():
+            rows.append(serializer.to_ingest_row())
+            indexes.append(index)
+        else:
+            errors.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+    return rows, indexes, errors
+
+
 class AverageRatingSerializer(serializers.ModelSerializer):
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
 
     class Meta:
-        model = Opinion
-        fields = ['id', 'average_rating']
+        model = Book
+        fields = ['id', 'average_rating', 'rating_count', 'rating_histogram']
 
-    def get_average_rating(self, obj):
-        avg_rating = Opinion.objects.filter(book=obj).aggregate(Avg('rating'))['rating__avg']
-        return avg_rating or 0
-    
 
 class TopBookSerializer(serializers.ModelSerializer):
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Book
-        fields = ['id', 'title', 'average_rating']
-
-    def get_average_rating(self, obj):
-        avg_rating = Opinion.objects.filter(book=obj).aggregate(Avg('rating'))['rating__avg']
-        return avg_rating or 0
\ No newline at end of file
+        fields = ['id', 'title', 'author', 'average_rating', 'rating_count', 'weighted_rating']
@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.review.models import Opinion
+from config.caching import invalidate_model
+
+@receiver(post_save, sender=Opinion)
+@receiver(post_delete, sender=Opinion)
+def opinion_changed(sender, **kwargs):
+    invalidate_model(Opinion)
@@ -0,0 +1,57 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, ExpressionWrapper, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
+from apps.book.models import Book
+import logging
+
+logger = logging.getLogger(__name__)
+
+RANKING_MEAN_CACHE_KEY = 'book_ranking_mean'
+
+
+def get_ranking_mean():
+    # The catalogue-wide mean moves slowly, so it is cached rather than
+    # recomputed for every incremental refresh.
+    mean = cache.get(RANKING_MEAN_CACHE_KEY)
+    if mean is None:
+        totals = Book.objects.aggregate(count=Sum('rating_count'), total=Sum('rating_sum'))
+        mean = totals['total'] / totals['count'] if totals['count'] else 0
+        cache.set(RANKING_MEAN_CACHE_KEY, mean, timeout=settings.TOP_BOOKS_MEAN_TIMEOUT)
+    return mean
+
+
+def weighted_rating_expression(mean):
+    # Bayesian average: every book starts with TOP_BOOKS_PRIOR_WEIGHT virtual
+    # ratings at the catalogue mean, so a handful of reviews can't top the chart.
+    prior_weight = settings.TOP_BOOKS_PRIOR_WEIGHT
+    weighted = ExpressionWrapper(
+        (Cast('rating_sum', FloatField()) + prior_weight * mean)
+        / (Cast('rating_count', FloatField()) + prior_weight),
+        output_field=FloatField(),
+    )
+    return Case(When(rating_count=0, then=Value(0.0)), default=weighted, output_field=FloatField())
+
+
+@shared_task
+def refresh_book_ranking_task(book_ids):
+    # A single UPDATE computed from the current aggregates, so overlapping
+    # refreshes of the same book can't write back stale scores.
+    Book.objects.filter(id__in=book_ids).update(weighted_rating=weighted_rating_expression(get_ranking_mean()))
+
+
+@shared_task
+def refresh_book_rankings_task(batch_size=1000):
+    cache.delete(RANKING_MEAN_CACHE_KEY)
+    expression = weighted_rating_expression(get_ranking_mean())
+    last_id = 0
+    refreshed = 0
+    while True:
+        ids = list(Book.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        Book.objects.filter(id__in=ids).update(weighted_rating=expression)
+        last_id = ids[-1]
+        refreshed += len(ids)
+    logger.info(f"Refreshed weighted ratings for {refreshed} books")
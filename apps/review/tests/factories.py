@@ -0,0 +1,15 @@
+import factory
+from factory.django import DjangoModelFactory
+from apps.review.models import Opinion
+from apps.book.tests.factories import BookFactory
+from apps.user.tests.factories import UserFactory
+
+
+class OpinionFactory(DjangoModelFactory):
+    class Meta:
+        model = Opinion
+
+    book = factory.SubFactory(BookFactory)
+    user = factory.SubFactory(UserFactory)
+    rating = factory.Faker('random_int', min=0, max=5)
+    comment = factory.Faker('sentence', nb_words=6)
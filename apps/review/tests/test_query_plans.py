@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.utils import timezone
+from apps.book.models import Book
+from apps.review.filters import OpinionFilter
+from apps.review.views import ReviewViewSet
+from apps.user.models import CustomUser
+from config.pagination import KeysetPagination
+from config.test_case import QueryPlanTestCase
+
+
+class TestReviewQueryPlans(QueryPlanTestCase):
+
+    def review_list(self, params):
+        queryset = OpinionFilter(params, queryset=ReviewViewSet.queryset.all()).qs
+        return queryset.order_by(*KeysetPagination.ordering)[:21]
+
+    def test_review_list_filters_use_indexes(self):
+        """
+        Test every documented review list filter combination is served by an index.
+        """
+        book = Book.objects.order_by('id')[100]
+        user = CustomUser.objects.filter(email='plan-7@example.com').get()
+        week_ago = (timezone.now() - timedelta(days=7)).date()
+        combinations = {
+            'no filters': {},
+            'book': {'book': book.id},
+            'user': {'user': user.id},
+            'rating range': {'rating_min': 4, 'rating_max': 5},
+            'created_at range': {'created_at_after': week_ago},
+            'book and rating': {'book': book.id, 'rating_min': 3},
+            'user and rating': {'user': user.id, 'rating_max': 1},
+        }
+        for label, params in combinations.items():
+            with self.subTest(label):
+                self.assertNoSeqScan(self.review_list(params), label)
@@ -0,0 +1,383 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from apps.book.models import Book
+from apps.review.models import Opinion
+from apps.book.tests.factories import BookFactory
+from apps.review.tasks import refresh_book_rankings_task
+from apps.review.tests.factories import OpinionFactory
+from apps.user.tests.factories import UserFactory
+from config.caching import get_generations, get_or_set_single_flight
+from config.test_case import ApiTestCase
+
+
+class TestRatingAggregates(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_review_updates_aggregates(self):
+        """
+        Test creating a review adds it to the book's rating aggregates.
+        """
+        response = self.client.post('/review/', {'book': self.book.id, 'rating': 4, 'comment': 'Good'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 1)
+        self.assertEqual(self.book.rating_sum, 4)
+        self.assertEqual(self.book.rating_histogram, [0, 0, 0, 0, 1, 0])
+
+    def test_update_review_moves_rating(self):
+        """
+        Test updating a review's rating and book moves it between aggregates.
+        """
+        response = self.client.post('/review/', {'book': self.book.id, 'rating': 2, 'comment': 'Meh'}, format='json')
+        other_book = BookFactory()
+        url = f"/review/{response.data['id']}/"
+        response = self.client.put(url, {'book': other_book.id, 'rating': 5, 'comment': 'Great'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 0)
+        self.assertEqual(self.book.rating_histogram, [0, 0, 0, 0, 0, 0])
+        self.assertEqual(other_book.rating_count, 1)
+        self.assertEqual(other_book.rating_sum, 5)
+
+    def test_delete_review_updates_aggregates(self):
+        """
+        Test deleting a review removes it from the book's rating aggregates.
+        """
+        response = self.client.post('/review/', {'book': self.book.id, 'rating': 3, 'comment': 'Ok'}, format='json')
+        response = self.client.delete(f"/review/{response.data['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 0)
+        self.assertEqual(self.book.rating_sum, 0)
+
+    def test_review_writes_bump_generation(self):
+        """
+        Test writing a review bumps the cache generation of opinions and books.
+        """
+        before = get_generations([Opinion, Book])
+        self.client.post('/review/', {'book': self.book.id, 'rating': 4, 'comment': 'Good'}, format='json')
+        after = get_generations([Opinion, Book])
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+
+    def test_rebuild_rating_aggregates(self):
+        """
+        Test the rebuild command recomputes aggregates from the opinions.
+        """
+        OpinionFactory(book=self.book, rating=1)
+        OpinionFactory(book=self.book, rating=5)
+        OpinionFactory(book=self.book, rating=5)
+        call_command('rebuild_rating_aggregates', batch_size=1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 3)
+        self.assertEqual(self.book.rating_sum, 11)
+        self.assertEqual(self.book.rating_histogram, [0, 1, 0, 0, 0, 2])
+
+    def test_rebuild_rating_aggregates_of_deleted_book(self):
+        """
+        Test the rebuild command also writes the aggregates of soft-deleted books.
+        """
+        tombstone = BookFactory()
+        OpinionFactory(book=tombstone, rating=4)
+        Book.all_objects.filter(pk=tombstone.pk).update(rating_count=0, rating_sum=0)
+        tombstone.soft_delete()
+        call_command('rebuild_rating_aggregates')
+        tombstone = Book.all_objects.get(pk=tombstone.pk)
+        self.assertEqual(tombstone.rating_count, 1)
+        self.assertEqual(tombstone.rating_sum, 4)
+
+    def test_average_ratings_query_count(self):
+        """
+        Test average ratings are read without a query per book.
+        """
+        for _ in range(5):
+            book = BookFactory()
+            book.set_rating_histogram([0, 0, 1, 0, 1, 0])
+            book.save()
+        with self.assertNumQueries(1):
+            response = self.client.get('/review/average_ratings/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ratings = {item['id']: item['average_rating'] for item in response.data['results']}
+        self.assertEqual(ratings[book.id], 3)
+        self.assertEqual(ratings[self.book.id], 0)
+
+
+class TestAverageRatingsPagination(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_average_ratings_pages(self):
+        """
+        Test average ratings are paginated by cursor and skip deleted books.
+        """
+        BookFactory.create_batch(3)
+        BookFactory(is_deleted=True)
+        live_ids = list(Book.objects.filter(is_deleted=False).order_by('id').values_list('id', flat=True))
+
+        response = self.client.get('/review/average_ratings/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        seen = [item['id'] for item in response.data['results']]
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        seen += [item['id'] for item in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(seen, live_ids)
+
+    def test_average_ratings_cached_per_page(self):
+        """
+        Test a repeated page is served from the cache without queries.
+        """
+        self.client.get('/review/average_ratings/', {'page_size': 2})
+        with self.assertNumQueries(0):
+            response = self.client.get('/review/average_ratings/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    def test_average_ratings_cached_per_host(self):
+        """
+        Test a page cached for one host does not hand its links to another.
+        """
+        BookFactory.create_batch(3)
+        self.client.get('/review/average_ratings/', {'page_size': 2}, HTTP_HOST='one.example.com')
+        response = self.client.get('/review/average_ratings/', {'page_size': 2}, HTTP_HOST='two.example.com')
+        self.assertTrue(response.data['next'].startswith('http://two.example.com/'))
+
+class TestTopBooks(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def rate(self, book, *ratings):
+        for rating in ratings:
+            user = UserFactory()
+            self.client.force_authenticate(user=user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/review/', {'book': book.id, 'rating': rating, 'comment': 'c'}, format='json')
+        self.client.force_authenticate(user=None)
+
+    def test_top_books_weighted_ranking(self):
+        """
+        Test a single 5-star review doesn't outrank many strong reviews.
+        """
+        single = BookFactory(title='Single')
+        popular = BookFactory(title='Popular')
+        self.rate(single, 5)
+        self.rate(popular, *[4] * 20)
+        self.rate(BookFactory(title='Poor'), *[1] * 20)
+        refresh_book_rankings_task()
+        response = self.client.get('/review/top_books/', {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [popular.id, single.id])
+
+    def test_top_books_filter_by_author(self):
+        """
+        Test the leaderboard can be filtered by author.
+        """
+        book = BookFactory(author='Author A')
+        self.rate(book, 3)
+        self.rate(BookFactory(author='Author B'), 5)
+        response = self.client.get('/review/top_books/', {'author': 'Author A'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [book.id])
+        self.assertGreater(response.data[0]['weighted_rating'], 0)
+
+
+class TestAverageRatingsStampede(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.computations = 0
+        self.counter_lock = threading.Lock()
+
+    def compute(self, value='fresh', latency=0.2):
+        def compute():
+            with self.counter_lock:
+                self.computations += 1
+            time.sleep(latency)
+            return value
+        return compute
+
+    def test_concurrent_misses_compute_once(self):
+        """
+        Test 100 concurrent misses on the same key recompute it only once.
+        """
+        compute = self.compute()
+        with ThreadPoolExecutor(100) as executor:
+            results = list(executor.map(
+                lambda _: get_or_set_single_flight('stampede-test', compute, timeout=60), range(100)
+            ))
+        self.assertEqual(self.computations, 1)
+        self.assertEqual(set(results), {'fresh'})
+
+    def test_stale_value_served_while_refreshing(self):
+        """
+        Test an expired value is served stale while another caller holds the lock.
+        """
+        get_or_set_single_flight('stale-test', lambda: 'stale', timeout=0, stale_timeout=60)
+        lock = cache.lock('stale-test:lock', timeout=10)
+        lock.acquire()
+        try:
+            self.assertEqual(get_or_set_single_flight('stale-test', self.compute(), timeout=60), 'stale')
+            self.assertEqual(self.computations, 0)
+        finally:
+            lock.release()
+        self.assertEqual(get_or_set_single_flight('stale-test', self.compute(), timeout=60), 'fresh')
+        self.assertEqual(self.computations, 1)
+
+
+class TestAsyncReviewViews(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_async_review_list_allows_anonymous(self):
+        """
+        Test the async review list is public like the sync list.
+        """
+        OpinionFactory.create_batch(3)
+        response = self.client.get('/review/async/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], self.client.get('/review/', {'page_size': 2}).json()['results'])
+
+    def test_reviews_of_deleted_books_hidden(self):
+        """
+        Test reviews of a soft-deleted book drop out of the sync, async and export reads.
+        """
+        live = OpinionFactory()
+        hidden = OpinionFactory()
+        hidden.book.soft_delete()
+        self.authenticate(self.user)
+
+        for url in ['/review/', '/review/async/']:
+            with self.subTest(url):
+                ids = [review['id'] for review in self.client.get(url).json()['results']]
+                self.assertEqual(ids, [live.id])
+        response = self.client.get('/review/export/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [live.id])
+        self.assertTrue(Opinion.all_objects.filter(pk=hidden.pk).exists())
+
+    def test_async_review_list_rejects_bad_token(self):
+        """
+        Test the async review list authenticates a supplied token and matches the sync list.
+        """
+        OpinionFactory.create_batch(3)
+        self.authenticate(self.user)
+        response = self.client.get('/review/async/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], self.client.get('/review/', {'page_size': 2}).json()['results'])
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(self.client.get('/review/async/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_average_ratings(self):
+        """
+        Test async average ratings match the sync endpoint and are cached.
+        """
+        self.book.set_rating_histogram([0, 0, 0, 1, 0, 1])
+        self.book.save()
+        response = self.client.get('/review/async/average_ratings/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()['results'], self.client.get('/review/average_ratings/').json()['results']
+        )
+        with self.assertNumQueries(0):
+            self.client.get('/review/async/average_ratings/')
+
+
+class TestBulkReviewIngestion(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.super_user)
+
+    def test_bulk_ingest_reports_each_failure(self):
+        """
+        Test a batch inserts valid new reviews, updates aggregates and reports
+        invalid, duplicate and unknown rows by index.
+        """
+        users = UserFactory.create_batch(3)
+        OpinionFactory(book=self.book, user=users[0], rating=1)
+        deleted = BookFactory(is_deleted=True)
+        reviews = [
+            {'book': self.book.id, 'user': users[1].id, 'rating': 5, 'comment': 'a'},
+            {'book': self.book.id, 'user': users[0].id, 'rating': 4, 'comment': 'already reviewed'},
+            {'book': self.book.id, 'user': users[2].id, 'rating': 9, 'comment': 'bad rating'},
+            {'book': deleted.id, 'user': users[2].id, 'rating': 3, 'comment': 'deleted book'},
+            {'book': self.book.id, 'user': 999999, 'rating': 3, 'comment': 'no user'},
+            {'book': self.book.id, 'user': users[2].id, 'rating': 3, 'comment': 'b'},
+            {'book': self.book.id, 'user': users[2].id, 'rating': 2, 'comment': 'repeated in batch'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/review/bulk/', {'reviews': reviews}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [(error['index'], error['status']) for error in response.data['errors']],
+            [(1, 'duplicate'), (2, 'invalid'), (3, 'book_not_found'), (4, 'user_not_found'), (6, 'duplicate')],
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_histogram, [0, 0, 0, 1, 0, 1])
+        self.assertGreater(self.book.weighted_rating, 0)
+
+    def test_bulk_ingest_query_count(self):
+        """
+        Test the number of queries per batch doesn't grow with its size.
+        """
+        def count_queries(size):
+            books = BookFactory.create_batch(size)
+            users = UserFactory.create_batch(size)
+            reviews = [
+                {'book': book.id, 'user': user.id, 'rating': 4, 'comment': 'c'} for book, user in zip(books, users)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/review/bulk/', {'reviews': reviews}, format='json')
+            self.assertEqual(response.data['created'], size)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+
+    def test_bulk_ingest_requires_admin(self):
+        """
+        Test only staff can bulk load reviews.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/review/bulk/', {'reviews': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_ingest_reviews_command(self):
+        """
+        Test the command loads an exported CSV file in batches.
+        """
+        users = UserFactory.create_batch(3)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('book,user,rating,comment\n')
+            for user in users:
+                handle.write(f'{self.book.id},{user.id},4,imported\n')
+        out = StringIO()
+        call_command('ingest_reviews', handle.name, batch_size=2, stdout=out)
+        os.unlink(handle.name)
+        self.assertIn('3 created', out.getvalue())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 3)
@@ -2,11 +2,13 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from .views import ReviewViewSet
+from .views import ReviewViewSet, average_ratings_async, review_list_async
 
 router = DefaultRouter()
 router.register(r'', ReviewViewSet, basename='review')
 
 urlpatterns = [
+    path('async/', review_list_async, name='review-list-async'),
+    path('async/average_ratings/', average_ratings_async, name='review-average-ratings-async'),
     path('', include(router.urls)),
 ]
@@ -1,12 +1,52 @@
-from django.core.cache import cache
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Avg
-from rest_framework import viewsets, permissions
+from django.db import transaction
+from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.response import Response
+from apps.book.models import RATING_AGGREGATE_FIELDS
 from .models import Opinion, Book
-from .serializers import ReviewSerializer, AverageRatingSerializer, TopBookSerializer 
+from .serializers import ReviewSerializer, AverageRatingSerializer, TopBookSerializer, validate_review_rows
 from .filters import OpinionFilter
+from .pagination import AverageRatingPagination
+from apps.user.authentication import CachedTokenAuthentication
+from config.pagination import KeysetPagination
+from .tasks import refresh_book_ranking_task
+from config.caching import aget_or_set_single_flight, get_or_set_single_flight
+from config.exports import get_export_format, streaming_export_response
+
+# (column, lookup) pairs streamed by the review export.
+REVIEW_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('book', 'book_id'),
+    ('user', 'user_id'),
+    ('rating', 'rating'),
+    ('comment', 'comment'),
+    ('created_at', 'created_at'),
+]
+
+
+def average_ratings_cache_key(request, paginator):
+    # One cache entry per page, so a miss only recomputes that page. The page
+    # holds absolute next/previous links, so the scheme and host are keyed too.
+    cursor = request.query_params.get(paginator.cursor_query_param, '')
+    page_size = paginator.get_page_size(request)
+    return f'average_ratings:{request.scheme}://{request.get_host()}{request.path}:{page_size}:{cursor}'
+
+
+def average_ratings_page(request, paginator):
+    queryset = Book.objects.only('id', *RATING_AGGREGATE_FIELDS)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = AverageRatingSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data).data
+
 
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Opinion.objects.all()
@@ -16,20 +56,143 @@ class ReviewViewSet(viewsets.ModelViewSet):
     filterset_class = OpinionFilter
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            opinion = serializer.save(user=self.request.user)
+            self.apply_rating_changes({opinion.book_id: {'added': [opinion.rating]}})
+
+    def perform_update(self, serializer):
+        previous_book_id = serializer.instance.book_id
+        previous_rating = serializer.instance.rating
+        with transaction.atomic():
+            opinion = serializer.save()
+            if (previous_book_id, previous_rating) == (opinion.book_id, opinion.rating):
+                return
+            changes = defaultdict(lambda: {'added': [], 'removed': []})
+            changes[previous_book_id]['removed'].append(previous_rating)
+            changes[opinion.book_id]['added'].append(opinion.rating)
+            self.apply_rating_changes(changes)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            self.apply_rating_changes({instance.book_id: {'removed': [instance.rating]}})
+
+    def apply_rating_changes(self, changes):
+        # Lock books in id order so concurrent moves between books can't deadlock.
+        book_ids = sorted(changes)
+        for book_id in book_ids:
+            Book.all_objects.adjust_ratings(book_id, **changes[book_id])
+        transaction.on_commit(lambda: refresh_book_ranking_task.delay(book_ids))
 
-    @action(detail=False, methods=['get'], serializer_class= AverageRatingSerializer, permission_classes=[permissions.AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk(self, request):
+        # Loads historical reviews for any users. Rows are validated in memory
+        # and failures are reported by index; the rest are inserted together.
+        items = request.data.get('reviews') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'reviews': ['Expected a non-empty list.']}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.REVIEW_INGEST_BATCH_SIZE:
+            return Response(
+                {'reviews': [f'At most {settings.REVIEW_INGEST_BATCH_SIZE} reviews per request.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows, indexes, errors = validate_review_rows(items)
+        statuses = Opinion.objects.bulk_ingest(rows) if rows else []
+        errors += [
+            {'index': index, 'status': result}
+            for index, result in zip(indexes, statuses) if result != 'created'
+        ]
+        return Response(
+            {'created': statuses.count('created'), 'errors': sorted(errors, key=lambda error: error['index'])},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Streams every review matching the list filters as ?output=ndjson|csv.
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        return streaming_export_response(request, queryset, REVIEW_EXPORT_FIELDS, export_format, 'reviews')
+
+    @action(
+        detail=False,
+        methods=['get'],
+        serializer_class=AverageRatingSerializer,
+        permission_classes=[permissions.AllowAny],
+        pagination_class=AverageRatingPagination,
+    )
     def average_ratings(self, request):
-        cache_key = 'average_ratings'
-        cached_data = cache.get(cache_key)
-        if not cached_data:
-            queryset = Book.objects.all()
-            serializer = AverageRatingSerializer(queryset, many=True)
-            cached_data = serializer.data
-            cache.set(cache_key, cached_data, timeout=60*1)
-        return Response(cached_data)
+        # Only one request rebuilds an expired page; the rest get the stale copy.
+        data = get_or_set_single_flight(
+            average_ratings_cache_key(request, self.paginator),
+            lambda: self.compute_average_ratings(request),
+            timeout=settings.AVERAGE_RATINGS_CACHE_TIMEOUT,
+            stale_timeout=settings.AVERAGE_RATINGS_STALE_TIMEOUT,
+        )
+        return Response(data)
+
+    def compute_average_ratings(self, request):
+        return average_ratings_page(request, self.paginator)
+
+    @action(detail=False, methods=['get'], serializer_class=TopBookSerializer, permission_classes=[permissions.AllowAny])
+    def top_books(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'limit': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.TOP_BOOKS_MAX_LIMIT))
+        # Reads the precomputed weighted_rating through its partial index, so the
+        # cost is bounded by limit rather than by the size of the catalogue.
+        queryset = Book.objects.filter(rating_count__gt=0)
+        author = request.query_params.get('author')
+        if author:
+            queryset = queryset.filter(author=author)
+        queryset = queryset.order_by('-weighted_rating', 'id').only(
+            'id', 'title', 'author', 'rating_count', 'rating_sum', 'weighted_rating'
+        )[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
     def get_permissions(self):
         if self.action == 'list':
             return [permissions.AllowAny()]
-        return super().get_permissions()
\ No newline at end of file
+        return super().get_permissions()
+
+
+# Async twins of the review list and average_ratings for ASGI deployments.
+
+@require_GET
+async def review_list_async(request):
+    # Anonymous reads are allowed, like ReviewViewSet.list; only a token that
+    # was sent and doesn't check out is rejected.
+    authentication = CachedTokenAuthentication()
+    try:
+        await authentication.aauthenticate(request)
+    except AuthenticationFailed as e:
+        response = JsonResponse({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = authentication.authenticate_header(request)
+        return response
+
+    filterset = OpinionFilter(request.GET, queryset=ReviewViewSet.queryset.all())
+    if not filterset.is_valid():
+        return JsonResponse(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+    paginator = KeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(filterset.qs, Request(request))
+    except NotFound as e:
+        return JsonResponse({'detail': e.detail}, status=status.HTTP_404_NOT_FOUND)
+    data = paginator.get_paginated_data(ReviewSerializer(page, many=True).data)
+    return JsonResponse(data, encoder=JSONEncoder)
+
+
+@require_GET
+async def average_ratings_async(request):
+    request = Request(request)
+    paginator = AverageRatingPagination()
+    data = await aget_or_set_single_flight(
+        average_ratings_cache_key(request, paginator),
+        lambda: average_ratings_page(request, paginator),
+        timeout=settings.AVERAGE_RATINGS_CACHE_TIMEOUT,
+        stale_timeout=settings.AVERAGE_RATINGS_STALE_TIMEOUT,
+    )
+    return JsonResponse(data, encoder=JSONEncoder)
@@ -0,0 +1,112 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+# Redis hash of user id -> unix time of their token's last use, drained into
+# CustomUser.last_seen by flush_token_last_seen_task.
+TOKEN_LAST_SEEN_KEY = 'auth_tokens:last_seen'
+
+
+def token_cache_key(key):
+    # Hash the key so raw tokens never appear in the cache keyspace.
+    return f"auth_token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def invalidate_cached_tokens(*keys):
+    if keys:
+        cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def invalidate_user_tokens(user):
+    invalidate_cached_tokens(*Token.objects.filter(user_id=user.pk).values_list('key', flat=True))
+    invalidate_cached_logins(user.email)
+
+
+def touch_token(token):
+    get_redis_connection('default').hset(TOKEN_LAST_SEEN_KEY, token.user_id, time.time())
+
+
+def token_is_expired(token):
+    # Tokens expire AUTH_TOKEN_TTL seconds after they were created or last used,
+    # whichever is later. Use since the last flush is still only in Redis.
+    ttl = timedelta(seconds=settings.AUTH_TOKEN_TTL)
+    now = timezone.now()
+    last_seen = max(filter(None, [token.created, token.user.last_seen]))
+    if now < last_seen + ttl:
+        return False
+    pending = get_redis_connection('default').hget(TOKEN_LAST_SEEN_KEY, token.user_id)
+    return pending is None or now >= datetime.fromtimestamp(float(pending), tz=dt_timezone.utc) + ttl
+
+
+def login_cache_key(email):
+    return f"login:{hashlib.sha256(email.encode()).hexdigest()}"
+
+
+def invalidate_cached_logins(*emails):
+    if emails:
+        cache.delete_many([login_cache_key(email) for email in emails])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that resolves token -> user from the cache, so hot
+    authenticated endpoints don't join authtoken_token and user_customuser on
+    every request. Entries live for AUTH_TOKEN_CACHE_TIMEOUT seconds and are
+    dropped explicitly on logout, password change and token deletion.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self.check_expiry(token)
+        return token.user, token
+
+    def check_expiry(self, token):
+        # Sliding expiry: every request pushes the token's deadline back with a
+        # Redis write; the database is only written by the periodic flush.
+        if token_is_expired(token):
+            # The cached copy may predate the last flush, so confirm before rejecting.
+            fresh = self.get_model().objects.select_related('user').filter(key=token.key).first()
+            if fresh is None or token_is_expired(fresh):
+                invalidate_cached_tokens(token.key)
+                raise exceptions.AuthenticationFailed(_('Token has expired.'))
+            cache.set(token_cache_key(token.key), fresh, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        touch_token(token)
+
+    async def aauthenticate(self, request):
+        # For plain async views, which can't go through DRF's sync authentication.
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        cache_key = token_cache_key(key)
+        token = await cache.aget(cache_key)
+        if token is None:
+            try:
+                token = await self.get_model().objects.select_related('user').aget(key=key)
+            except self.get_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            await cache.aset(cache_key, token, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        await sync_to_async(self.check_expiry)(token)
+        return token.user, token
@@ -0,0 +1,79 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from apps.user.models import CustomUser
+from apps.user.views import RegisterView
+from config.celery import app as celery_app
+
+
+class Command(BaseCommand):
+    help = 'Measures /user/register/ throughput and latency for each password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Registrations per hasher')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument(
+            '--hashers', nargs='+', default=['pbkdf2', 'scrypt', 'argon2'],
+            choices=sorted(settings.AVAILABLE_PASSWORD_HASHERS),
+        )
+
+    def handle(self, *args, **options):
+        self.view = RegisterView.as_view()
+        self.factory = APIRequestFactory()
+        # Emails are sent eagerly to locmem so the numbers cover the whole request.
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                VERIFICATION_EMAIL_BATCH_WINDOW=0,
+            ):
+                for name in options['hashers']:
+                    self.bench(name, options['count'], options['concurrency'])
+        finally:
+            celery_app.conf.task_always_eager = eager
+
+    def bench(self, name, count, concurrency):
+        hasher = settings.AVAILABLE_PASSWORD_HASHERS[name]
+        prefix = f'bench-register-{uuid.uuid4().hex[:8]}'
+        with override_settings(PASSWORD_HASHERS=[hasher]):
+            try:
+                with ThreadPoolExecutor(concurrency) as executor:
+                    started = time.perf_counter()
+                    latencies = list(executor.map(
+                        lambda index: self.register(f'{prefix}-{index}@example.com'), range(count)
+                    ))
+                    elapsed = time.perf_counter() - started
+            except ValueError as e:
+                # e.g. argon2 without argon2-cffi installed.
+                raise CommandError(f'{name}: {e}')
+            finally:
+                # Every request commits on its own connection, so clean up afterwards.
+                CustomUser.objects.filter(email__startswith=prefix).delete()
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: {count} registrations in {elapsed:.2f}s ({count / elapsed:.0f}/sec), '
+            f'p50 {p50:.1f}ms, p99 {p99:.1f}ms'
+        ))
+
+    def register(self, email):
+        request = self.factory.post(
+            '/user/register/', {'email': email, 'password': 'Bench@password123'}, format='json'
+        )
+        started = time.perf_counter()
+        try:
+            response = self.view(request)
+        finally:
+            close_old_connections()
+        if response.status_code != 201:
+            raise CommandError(f'Registration of {email} failed: {response.status_code} {response.data}')
+        return time.perf_counter() - started
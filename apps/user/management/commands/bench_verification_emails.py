@@ -0,0 +1,95 @@
+import tempfile
+import time
+import uuid
+
+from django.core.mail.backends import filebased, locmem
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from apps.user.models import CustomUser
+from apps.user.tasks import send_verification_email_task, send_verification_emails
+
+
+class SimulatedHandshakeMixin:
+    # Offline backends have no connection setup cost, so opening a connection
+    # sleeps for --connect-latency to stand in for the SMTP/TLS handshake.
+    connect_latency = 0
+    connections_opened = 0
+
+    def open(self):
+        if getattr(self, 'handshake_done', False):
+            return False
+        time.sleep(self.connect_latency)
+        SimulatedHandshakeMixin.connections_opened += 1
+        self.handshake_done = True
+        super().open()
+        return True
+
+    def close(self):
+        self.handshake_done = False
+        super().close()
+
+    def send_messages(self, email_messages):
+        new_connection = self.open()
+        try:
+            return super().send_messages(email_messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class LocmemBackend(SimulatedHandshakeMixin, locmem.EmailBackend):
+    pass
+
+
+class FileBackend(SimulatedHandshakeMixin, filebased.EmailBackend):
+    pass
+
+
+BACKENDS = {'locmem': LocmemBackend, 'file': FileBackend}
+
+
+class Command(BaseCommand):
+    help = 'Measures verification email throughput offline: one connection per email vs batched over one connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='locmem')
+        parser.add_argument('--connect-latency', type=float, default=50, help='Simulated handshake cost in ms')
+
+    def handle(self, *args, **options):
+        backend = BACKENDS[options['backend']]
+        SimulatedHandshakeMixin.connect_latency = options['connect_latency'] / 1000
+        email_settings = {'EMAIL_BACKEND': f'{backend.__module__}.{backend.__name__}'}
+        if options['backend'] == 'file':
+            email_settings['EMAIL_FILE_PATH'] = tempfile.mkdtemp(prefix='bench-emails-')
+
+        # The benchmark users are rolled back at the end.
+        with override_settings(**email_settings), transaction.atomic():
+            users = CustomUser.objects.bulk_create([
+                CustomUser(email=f'bench-{uuid.uuid4()}@example.com')
+                for _ in range(options['count'])
+            ])
+            user_ids = [user.id for user in users]
+
+            self.report('one connection per email', len(user_ids), lambda: [
+                send_verification_email_task(user_id) for user_id in user_ids
+            ])
+
+            batch_size = options['batch_size']
+            self.report('batched', len(user_ids), lambda: [
+                send_verification_emails(user_ids[start:start + batch_size])
+                for start in range(0, len(user_ids), batch_size)
+            ])
+            transaction.set_rollback(True)
+
+    def report(self, label, count, send):
+        SimulatedHandshakeMixin.connections_opened = 0
+        started = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {count} emails in {elapsed:.2f}s, '
+            f'{SimulatedHandshakeMixin.connections_opened} connections, {count / elapsed:.0f} emails/sec'
+        )
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:14
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def copy_pending_tokens_to_cache(apps, schema_editor):
+    # Links already emailed to unverified users keep working for one more TTL.
+    # The key format is apps.user.utils.verification_cache_key as of this
+    # migration, inlined so later changes there can't break it. Only the cache
+    # configured for this migrate run is filled; a fresh database has nothing
+    # to copy.
+    CustomUser = apps.get_model('user', 'CustomUser')
+    pending = CustomUser.objects.filter(is_verified=False).values_list('id', 'verification_token')
+    batch = {}
+    for user_id, token in pending.iterator(chunk_size=BATCH_SIZE):
+        batch[f"email_verification:{hashlib.sha256(str(token).encode()).hexdigest()}"] = user_id
+        if len(batch) >= BATCH_SIZE:
+            cache.set_many(batch, timeout=settings.VERIFICATION_TOKEN_TTL)
+            batch = {}
+    if batch:
+        cache.set_many(batch, timeout=settings.VERIFICATION_TOKEN_TTL)
+
+
+def backfill_tokens(apps, schema_editor):
+    # On rollback the column comes back empty; give every row its own token
+    # before the unique constraint is restored.
+    CustomUser = apps.get_model('user', 'CustomUser')
+    users = []
+    for user in CustomUser.objects.filter(verification_token__isnull=True).only('id').iterator(chunk_size=BATCH_SIZE):
+        user.verification_token = uuid.uuid4()
+        users.append(user)
+        if len(users) >= BATCH_SIZE:
+            CustomUser.objects.bulk_update(users, ['verification_token'])
+            users = []
+    CustomUser.objects.bulk_update(users, ['verification_token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_customuser_last_seen'),
+    ]
+
+    # Reversed, these run bottom-up: re-add the column as nullable, backfill a
+    # token per row, then restore the unique default.
+    operations = [
+        migrations.RunPython(copy_pending_tokens_to_cache, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='verification_token',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, backfill_tokens),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='verification_token',
+        ),
+    ]
@@ -1,7 +1,7 @@
-import uuid
-
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -13,7 +13,6 @@ class CustomUserManager(BaseUserManager):
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
-        user.verification_token = uuid.uuid4()
         user.save() # remove self.db
         return user
 
@@ -31,17 +30,40 @@ class CustomUser(AbstractBaseUser):
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
     is_verified = models.BooleanField(default=False)
-    verification_token = models.UUIDField(default=uuid.uuid4, unique=True)
     is_superuser = models.BooleanField(default=False)
+    # Last use of the user's API token, written in batches from Redis by
+    # flush_token_last_seen_task; lags real activity by up to one flush.
+    last_seen = models.DateTimeField(null=True, blank=True, editable=False)
 
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
+    # Changing any of these retires the user's cached tokens and logins.
+    AUTH_FIELDS = ('email', 'password', 'is_staff', 'is_superuser', 'is_verified')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='user_date_joined_id_idx'),
+            # icontains filters on the user directory. Django compares
+            # UPPER(column), so the trigram indexes use the same expression.
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='user_first_name_trgm_idx'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='user_last_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Deferred fields are not in __dict__, nor saved until they are set.
+        instance._loaded_auth_values = {
+            field: instance.__dict__[field] for field in cls.AUTH_FIELDS if field in instance.__dict__
+        }
+        return instance
+
     def has_perm(self, perm, obj=None):
         return self.is_staff
 
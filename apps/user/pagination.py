@@ -0,0 +1,5 @@
+from config.pagination import KeysetPagination
+
+
+class UserPagination(KeysetPagination):
+    ordering = ('-date_joined', '-id')
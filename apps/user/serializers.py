@@ -2,15 +2,23 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
-from django.contrib.auth import authenticate
-from rest_framework.validators import UniqueValidator
+from django.db import IntegrityError, transaction
 
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
 
-from .utils import send_verification_email
+from .utils import StepTimer, send_verification_email
 
-from apps.user.tasks import send_verification_email_task
+from apps.user.authentication import (
+    invalidate_user_tokens,
+    login_cache_key,
+    token_cache_key,
+    token_is_expired,
+    touch_token,
+)
+from apps.user.tasks import queue_verification_email
 
 
 User = get_user_model()
@@ -21,10 +29,9 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'first_name', 'last_name', 'is_active', 'date_joined']
 
 class RegisterSerializer(serializers.ModelSerializer):
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all(), message="A user with that email already exists.")]
-    )
+    # No UniqueValidator: the unique index on email rejects duplicates in the
+    # INSERT itself, which saves a query on every signup and has no race.
+    email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
 
     class Meta:
@@ -32,15 +39,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ('email', 'password', 'first_name', 'last_name')
 
     def create(self, validated_data):
-        
-        user = User.objects.create_user(
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data.get('first_name', ''),
-            last_name=validated_data.get('last_name', '')
-        )
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    email=validated_data['email'],
+                    password=validated_data['password'],
+                    first_name=validated_data.get('first_name', ''),
+                    last_name=validated_data.get('last_name', '')
+                )
+        except IntegrityError:
+            if User.objects.filter(email=User.objects.normalize_email(validated_data['email'])).exists():
+                raise serializers.ValidationError({'email': ["A user with that email already exists."]})
+            raise
         #send_verification_email(user)
-        send_verification_email_task.delay(user.id)
+        queue_verification_email(user.id)
         return user
 
 class LoginSerializer(serializers.Serializer):
@@ -52,18 +64,64 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if email and password:
-            user = authenticate(request=self.context.get('request'), email=email, password=password)
-            if user:
+            # Same checks as authenticate() with ModelBackend, but the user and
+            # their token come from one query, or from the cache after a
+            # recent successful login.
+            timer = self.context.get('timer') or StepTimer()
+            email = User.objects.normalize_email(email)
+            with timer('lookup'):
+                token = self.get_cached_token(email)
+                user = token.user if token is not None else self.get_user(email)
+            with timer('hash'):
+                if user is None:
+                    # Hash anyway so unknown emails take as long as wrong passwords.
+                    User().set_password(password)
+                    valid = False
+                else:
+                    valid = user.check_password(password) and user.is_active
+            if valid:
                 if not user.is_verified:
                     raise serializers.ValidationError("Email not verified. Please check your email to verify your account.")
-                
+                if token is None:
+                    with timer('token'):
+                        token = self.get_token(user)
+                    cache.set_many({
+                        login_cache_key(email): token,
+                        token_cache_key(token.key): token,
+                    }, timeout=min(settings.LOGIN_CACHE_TIMEOUT, settings.AUTH_TOKEN_CACHE_TIMEOUT))
+                touch_token(token)
                 attrs['user'] = user
+                attrs['token'] = token
                 return attrs
             else: 
                 raise serializers.ValidationError("Invalid credentials. Please try again.")
         else:
             raise serializers.ValidationError("Must include 'email' and 'password'.")
 
+    def get_cached_token(self, email):
+        token = cache.get(login_cache_key(email))
+        # Deleting a token drops its auth cache entry, which retires the cached login too.
+        if token is None or cache.get(token_cache_key(token.key)) is None or token_is_expired(token):
+            return None
+        return token
+
+    def get_user(self, email):
+        return User.objects.select_related('auth_token').filter(email=email).first()
+
+    def get_token(self, user):
+        try:
+            token = user.auth_token
+            token.user = user
+            if not token_is_expired(token):
+                return token
+            # An expired token is replaced rather than revived.
+            token.delete()
+        except Token.DoesNotExist:
+            pass
+        token, _ = Token.objects.get_or_create(user=user)
+        token.user = user
+        return token
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
@@ -83,5 +141,6 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         user.set_password(self.validated_data['new_password'])
         user.save(update_fields=['password']) 
+        invalidate_user_tokens(user)
         return user
 
@@ -1,8 +1,34 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from apps.user.authentication import invalidate_cached_logins, invalidate_cached_tokens, invalidate_user_tokens
 from apps.user.models import CustomUser
 
-@receiver(post_save, sender = CustomUser)
-def user_creation(sender, instance, created, **kwargs):
-    if created:
-        print('A new user is cretated9signal message): ', instance.first_name , instance.email)
\ No newline at end of file
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Also fires when a user is deleted and their token cascades.
+    # Cached logins check this entry too, so they are retired along with it.
+    invalidate_cached_tokens(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # Cached tokens and logins carry the user as it was when they were cached,
+    # so a deactivated or changed user must not keep authenticating from them.
+    # New users have nothing cached, and saves that only touch other fields
+    # (last_login, profile names) leave the cached copies valid.
+    loaded = instance.__dict__.setdefault('_loaded_auth_values', {})
+    saved = {
+        field: instance.__dict__[field] for field in CustomUser.AUTH_FIELDS
+        if field in instance.__dict__ and (update_fields is None or field in update_fields)
+    }
+    changed = [field for field, value in saved.items() if field not in loaded or loaded[field] != value]
+    loaded.update(saved)
+    if changed and not created:
+        invalidate_user_tokens(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    # The user's token cascades and drops its own cache entry.
+    invalidate_cached_logins(instance.email)
@@ -1,28 +1,163 @@
 import os
+from datetime import datetime, timedelta, timezone as dt_timezone
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.authtoken.models import Token
+from .authentication import TOKEN_LAST_SEEN_KEY
 from .models import CustomUser
+from .utils import create_verification_tokens
 import logging
 from django.conf import settings
 from django.urls import reverse
 
-@shared_task
-def send_verification_email_task(user_id):
-    logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
+
+PENDING_VERIFICATION_EMAILS_KEY = 'verification_emails:pending'
+PROCESSING_VERIFICATION_EMAILS_KEY = 'verification_emails:processing'
+VERIFICATION_FLUSH_SCHEDULED_KEY = 'verification_emails:flush_scheduled'
+
+
+def build_verification_email(user, token, connection=None):
+    verification_url = f"{settings.SITE_URL}{reverse('verify-email', args=[token])}"
+    return EmailMessage(
+        'Verify your email',
+        f'Please verify your email by clicking on the following link: {verification_url}',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        connection=connection,
+    )
+
+
+def queue_verification_email(user_id):
+    window = settings.VERIFICATION_EMAIL_BATCH_WINDOW
+    if not window:
+        send_verification_email_task.delay(user_id)
+        return
+    # Collect signups for `window` seconds and send them over one connection.
+    # The flag makes sure exactly one flush is pending; the flush clears it
+    # before draining so signups arriving mid-flush schedule the next one.
+    get_redis_connection('default').rpush(PENDING_VERIFICATION_EMAILS_KEY, user_id)
+    if cache.add(VERIFICATION_FLUSH_SCHEDULED_KEY, True, timeout=window * 2):
+        send_pending_verification_emails_task.apply_async(countdown=window)
+
+
+def send_verification_emails(user_ids):
+    users = list(
+        CustomUser.objects.filter(id__in=user_ids, is_verified=False).only('id', 'email')
+    )
+    if not users:
+        return 0
+    tokens = create_verification_tokens([user.id for user in users])
+
+    failed = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open email connection for {len(users)} verification emails: {e}")
+        failed = [user.id for user in users]
+    else:
+        try:
+            for user in users:
+                try:
+                    connection.send_messages([build_verification_email(user, tokens[user.id], connection=connection)])
+                except Exception as e:
+                    logger.error(f"Error sending verification email to {user.email}: {e}")
+                    failed.append(user.id)
+        finally:
+            connection.close()
+
+    # Failed messages fall back to the single-email task, which retries on its own.
+    for user_id in failed:
+        send_verification_email_task.delay(user_id)
+    logger.info(f"Sent {len(users) - len(failed)} of {len(users)} verification emails over one connection")
+    return len(users) - len(failed)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_verification_email_task(self, user_id):
     try:
         logger.info(f"EMAIL_HOST: {os.environ.get('EMAIL_HOST')}")
-        user = CustomUser.objects.get(id=user_id)
-        verification_url = f"{settings.SITE_URL}{reverse('verify-email', args=[user.verification_token])}"
-        send_mail(
-            'Verify your email',
-            f'Please verify your email by clicking on the following link: {verification_url}',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        user = CustomUser.objects.only('id', 'email').get(id=user_id)
+        token = create_verification_tokens([user.id])[user.id]
+        build_verification_email(user, token).send(fail_silently=False)
         logger.info(f"Verification email sent to {user.email}")
+    except CustomUser.DoesNotExist:
+        logger.error(f"Error sending verification email: user {user_id} does not exist")
     except Exception as e:
         logger.error(f"Error sending verification email: {e}")
+        raise self.retry(exc=e)
+
+
+@shared_task
+def send_pending_verification_emails_task():
+    cache.delete(VERIFICATION_FLUSH_SCHEDULED_KEY)
+    redis = get_redis_connection('default')
+    batch_size = settings.VERIFICATION_EMAIL_BATCH_SIZE
+    # A flush that died mid-batch left its ids in the processing list; put
+    # them back at the head of the queue, in order.
+    while redis.lmove(PROCESSING_VERIFICATION_EMAILS_KEY, PENDING_VERIFICATION_EMAILS_KEY, 'RIGHT', 'LEFT'):
+        pass
+    sent = 0
+    while True:
+        # Each batch is parked in the processing list until it has been handed
+        # off, so a failing or killed flush does not lose signups.
+        with redis.pipeline() as pipe:
+            for _ in range(batch_size):
+                pipe.lmove(PENDING_VERIFICATION_EMAILS_KEY, PROCESSING_VERIFICATION_EMAILS_KEY, 'LEFT', 'RIGHT')
+            user_ids = [int(user_id) for user_id in pipe.execute() if user_id is not None]
+        if not user_ids:
+            break
+        try:
+            sent += send_verification_emails(user_ids)
+        except Exception as e:
+            logger.error(f"Error sending {len(user_ids)} verification emails, sending them one by one: {e}")
+            for user_id in user_ids:
+                send_verification_email_task.delay(user_id)
+        redis.delete(PROCESSING_VERIFICATION_EMAILS_KEY)
+    return sent
 
 
+@shared_task
+def flush_token_last_seen_task(batch_size=None):
+    # Drain the hash atomically so uses recorded mid-flush land in the next one.
+    redis = get_redis_connection('default')
+    with redis.pipeline() as pipe:
+        pipe.hgetall(TOKEN_LAST_SEEN_KEY)
+        pipe.delete(TOKEN_LAST_SEEN_KEY)
+        last_seen, _ = pipe.execute()
+    users = [
+        CustomUser(id=int(user_id), last_seen=datetime.fromtimestamp(float(seen), tz=dt_timezone.utc))
+        for user_id, seen in last_seen.items()
+    ]
+    # bulk_update sends no post_save, so cached logins and tokens stay warm.
+    CustomUser.objects.bulk_update(
+        users, ['last_seen'], batch_size=batch_size or settings.TOKEN_LAST_SEEN_FLUSH_BATCH_SIZE
+    )
+    logger.info(f"Flushed last seen time of {len(users)} tokens")
+    return len(users)
 
+
+@shared_task
+def purge_expired_tokens_task(batch_size=None):
+    flush_token_last_seen_task()
+    batch_size = batch_size or settings.TOKEN_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL)
+    expired = Token.objects.filter(created__lt=cutoff).filter(
+        Q(user__last_seen__isnull=True) | Q(user__last_seen__lt=cutoff)
+    )
+    purged = 0
+    while True:
+        keys = list(expired.values_list('key', flat=True)[:batch_size])
+        if not keys:
+            break
+        with transaction.atomic():
+            Token.objects.filter(key__in=keys).delete()
+        purged += len(keys)
+    logger.info(f"Purged {purged} tokens unused since {cutoff:%Y-%m-%d %H:%M}")
+    return purged
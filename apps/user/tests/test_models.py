@@ -1,6 +1,5 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
-from uuid import UUID
 
 User = get_user_model()
 
@@ -10,7 +9,7 @@ class CustomUserModelTest(TestCase):
         user = User.objects.create_user(email='testuser@example.com', password='testpassword123')
         self.assertEqual(user.email, 'testuser@example.com')
         self.assertTrue(user.check_password('testpassword123'))
-        self.assertIsInstance(user.verification_token, UUID)
+        self.assertFalse(user.is_verified)
 
     def test_create_superuser(self):
         superuser = User.objects.create_superuser(email='admin@example.com', password='adminpassword123')
@@ -0,0 +1,50 @@
+from datetime import timedelta
+from django.utils import timezone
+from apps.user.filters import CustomUserFilter
+from apps.user.models import CustomUser
+from apps.user.pagination import UserPagination
+from apps.user.views import UserViewSet
+from config.test_case import QueryPlanTestCase
+
+PAGE = 21
+
+
+class TestUserQueryPlans(QueryPlanTestCase):
+    # Only the users table is queried here.
+    users = 5000
+    books = 0
+
+    def user_list(self, params):
+        # The queryset UserViewSet.list runs: filterset, then keyset ordering.
+        queryset = CustomUserFilter(params, queryset=UserViewSet.queryset.all()).qs
+        return queryset.order_by(*UserPagination.ordering)[:PAGE]
+
+    def test_user_directory_filters_use_indexes(self):
+        """
+        Test every user directory filter is served by an index.
+        """
+        month_ago = (timezone.now() - timedelta(days=30)).date()
+        year_ago = (timezone.now() - timedelta(days=365)).date()
+        combinations = {
+            'no filters': {},
+            'email': {'email': 'plan-123'},
+            'first_name': {'first_name': self.words[8][:4]},
+            'last_name': {'last_name': self.words[9]},
+            'date_joined range': {'date_joined_after': year_ago, 'date_joined_before': month_ago},
+            'email and last_name': {'email': 'plan-4', 'last_name': self.words[10][:4]},
+        }
+        for label, params in combinations.items():
+            with self.subTest(label):
+                self.assertNoSeqScan(self.user_list(params), label)
+
+    def test_user_directory_next_page_uses_index(self):
+        """
+        Test a keyset page deep into the user directory is a range scan.
+        """
+        user = CustomUser.objects.order_by('-date_joined', '-id')[2000]
+        pagination = UserPagination()
+        queryset = (
+            UserViewSet.queryset.filter(pagination.position_filter(pagination.ordering, [user.date_joined, user.id]))
+            .order_by(*pagination.ordering)[:PAGE]
+        )
+        self.assertNoSeqScan(queryset, 'next page')
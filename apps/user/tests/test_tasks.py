@@ -0,0 +1,132 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.authtoken.models import Token
+from apps.user.tasks import (
+    PENDING_VERIFICATION_EMAILS_KEY,
+    PROCESSING_VERIFICATION_EMAILS_KEY,
+    flush_token_last_seen_task,
+    purge_expired_tokens_task,
+    send_pending_verification_emails_task,
+    send_verification_emails,
+)
+from apps.user.authentication import TOKEN_LAST_SEEN_KEY, touch_token
+from apps.user.models import CustomUser
+from apps.user.tests.factories import UserFactory
+
+
+class VerificationEmailBatchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_redis_connection('default').delete(PENDING_VERIFICATION_EMAILS_KEY, PROCESSING_VERIFICATION_EMAILS_KEY)
+
+    def test_batch_uses_one_connection(self):
+        """
+        Test a batch of verification emails is sent over a single connection.
+        """
+        users = UserFactory.create_batch(3)
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as mock_open:
+            sent = send_verification_emails([user.id for user in users])
+        self.assertEqual(sent, 3)
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(user.email for user in users))
+
+    @patch('apps.user.tasks.send_verification_email_task.delay')
+    def test_failed_message_is_retried_individually(self, mock_delay):
+        """
+        Test one failing message is handed to the retrying single-email task.
+        """
+        good, bad = UserFactory.create_batch(2)
+        send_messages = mail.get_connection().send_messages
+
+        def fail_for_bad_user(self, messages):
+            if messages[0].to == [bad.email]:
+                raise ConnectionError('Connection reset')
+            return send_messages(messages)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', fail_for_bad_user):
+            sent = send_verification_emails([good.id, bad.id])
+        self.assertEqual(sent, 1)
+        mock_delay.assert_called_once_with(bad.id)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, VERIFICATION_EMAIL_BATCH_WINDOW=5)
+    def test_register_queues_verification_email(self):
+        """
+        Test registering queues the verification email and the flush sends it.
+        """
+        with patch('apps.user.tasks.send_pending_verification_emails_task.apply_async') as mock_flush:
+            response = self.client.post('/user/register/', {'email': 'queued@example.com', 'password': 'Apassword@123'})
+        self.assertEqual(response.status_code, 201)
+        mock_flush.assert_called_once_with(countdown=5)
+        self.assertEqual(len(mail.outbox), 0)
+
+        send_pending_verification_emails_task()
+        self.assertEqual([message.to for message in mail.outbox], [['queued@example.com']])
+
+
+    @patch('apps.user.tasks.send_verification_email_task.delay')
+    def test_failed_flush_falls_back_to_single_emails(self, mock_delay):
+        """
+        Test a batch that fails as a whole is handed to the single-email task instead of being dropped.
+        """
+        users = UserFactory.create_batch(2)
+        redis = get_redis_connection('default')
+        redis.rpush(PENDING_VERIFICATION_EMAILS_KEY, *[user.id for user in users])
+        with patch('apps.user.tasks.create_verification_tokens', side_effect=ConnectionError('Redis down')):
+            self.assertEqual(send_pending_verification_emails_task(), 0)
+        self.assertEqual([call.args for call in mock_delay.call_args_list], [(user.id,) for user in users])
+        self.assertFalse(redis.exists(PENDING_VERIFICATION_EMAILS_KEY, PROCESSING_VERIFICATION_EMAILS_KEY))
+
+    def test_flush_recovers_interrupted_batch(self):
+        """
+        Test ids left in the processing list by a flush that died are sent by the next flush.
+        """
+        interrupted, queued = UserFactory.create_batch(2)
+        redis = get_redis_connection('default')
+        redis.rpush(PROCESSING_VERIFICATION_EMAILS_KEY, interrupted.id)
+        redis.rpush(PENDING_VERIFICATION_EMAILS_KEY, queued.id)
+        self.assertEqual(send_pending_verification_emails_task(), 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted([interrupted.email, queued.email]))
+        self.assertFalse(redis.exists(PROCESSING_VERIFICATION_EMAILS_KEY))
+
+class TokenActivityTaskTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_redis_connection('default').delete(TOKEN_LAST_SEEN_KEY)
+
+    def test_flush_writes_last_seen(self):
+        """
+        Test the flush copies last seen times from Redis to users and empties the hash.
+        """
+        user = UserFactory()
+        touch_token(Token.objects.create(user=user))
+        self.assertEqual(flush_token_last_seen_task(), 1)
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_seen)
+        self.assertFalse(get_redis_connection('default').exists(TOKEN_LAST_SEEN_KEY))
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_purge_deletes_only_expired_tokens(self):
+        """
+        Test the purge deletes tokens unused past the TTL, counting activity not yet flushed.
+        """
+        expired, flushed, pending, fresh = UserFactory.create_batch(4)
+        old = timezone.now() - timedelta(minutes=5)
+        for user in (expired, flushed, pending):
+            Token.objects.create(user=user)
+        Token.objects.create(user=fresh)
+        Token.objects.exclude(user=fresh).update(created=old)
+        CustomUser.objects.filter(id=flushed.id).update(last_seen=timezone.now())
+        touch_token(Token.objects.get(user=pending))
+
+        self.assertEqual(purge_expired_tokens_task(batch_size=1), 1)
+        self.assertEqual(
+            set(Token.objects.values_list('user_id', flat=True)), {flushed.id, pending.id, fresh.id}
+        )
@@ -1,9 +1,23 @@
+import re
+
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
+from datetime import timedelta
 from django.urls import path, include
 from rest_framework import status
 from config.test_case import ApiTestCase
 from apps.user.models import CustomUser
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
+from apps.user.authentication import TOKEN_LAST_SEEN_KEY, token_cache_key, touch_token
+from apps.user.tasks import flush_token_last_seen_task, send_verification_emails
+from apps.user.utils import create_verification_tokens, verification_cache_key
 from apps.user.tests.factories import UserFactory
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
@@ -81,6 +95,37 @@ class UserRegistrationTests(ApiTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('email', response.data)
 
+    def test_register_duplicate_email(self):
+        """
+        Test that a duplicate email is rejected by the unique index with a field error.
+        """
+        UserFactory(email='existing@example.com')
+        data = dict(self.base_data, email='existing@example.com')
+        response = self.get_response(data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['email'][0], 'A user with that email already exists.')
+        self.assertEqual(CustomUser.objects.filter(email='existing@example.com').count(), 1)
+
+    def test_register_skips_uniqueness_query(self):
+        """
+        Test that a successful registration does not look the email up before inserting it.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_response(self.base_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lookups = [query['sql'] for query in queries if '"user_customuser"."email" =' in query['sql']]
+        self.assertEqual(lookups, [])
+
+
+    @patch('apps.user.serializers.queue_verification_email')
+    def test_register_query_count(self, mock_queue_verification_email):
+        """
+        Test that registering a user runs only the insert, without a token lookup from the save signal.
+        """
+        with self.assertNumQueries(3):
+            response = self.get_response(self.base_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_queue_verification_email.assert_called_once()
 
 class UserEmailVerificationTests(ApiTestCase):
 
@@ -90,10 +135,13 @@ class UserEmailVerificationTests(ApiTestCase):
         Test verifying email with a valid token and mock sending email task.
         '''
         user = UserFactory(is_verified=False)
-        url = f'/user/verify-email/{user.verification_token}/'
+        token = create_verification_tokens([user.id])[user.id]
+        url = f'/user/verify-email/{token}/'
 
-        # Trigger the email verification process
-        response = self.client.get(url, format='json')
+        # Trigger the email verification process; the token comes from the
+        # cache, so the only query is the UPDATE.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format='json')
 
         # Check response status
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -115,6 +163,33 @@ class UserEmailVerificationTests(ApiTestCase):
         user.refresh_from_db()
         self.assertFalse(user.is_verified)
 
+    def test_verify_email_link_from_sent_email(self):
+        '''
+        Test the link in a sent verification email verifies the user once.
+        '''
+        user = UserFactory(is_verified=False)
+        send_verification_emails([user.id])
+        url = re.search(r'/user/verify-email/[0-9a-f-]+/', mail.outbox[-1].body).group()
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.is_verified)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Email already verified.')
+
+    def test_verify_email_with_expired_token(self):
+        '''
+        Test a token that has dropped out of the cache no longer verifies.
+        '''
+        user = UserFactory(is_verified=False)
+        token = create_verification_tokens([user.id])[user.id]
+        cache.delete(verification_cache_key(token))
+        response = self.client.get(f'/user/verify-email/{token}/', format='json')
+        self.assertEqual(response.status_code, 404)
+
 
 class UserLoginTests(ApiTestCase):
  
@@ -164,8 +239,88 @@ class UserLoginTests(ApiTestCase):
         'Email not verified. Please check your email to verify your account.'
         )
 
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_login_upgrades_password_hasher(self):
+        '''
+        Test that a password stored with an older hasher is rehashed with the preferred one on login.
+        '''
+        user = UserFactory(is_verified=True)
+        user.password = make_password('Apassword@123', hasher='pbkdf2_sha256')
+        user.save(update_fields=['password'])
+
+        response = self.client.post('/user/login/', {'email': user.email, 'password': 'Apassword@123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.assertTrue(user.check_password('Apassword@123'))
+
+
+class LoginQueryTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.login_user = UserFactory(is_verified=True, password='Apassword@123')
+        self.token = Token.objects.create(user=self.login_user)
+        self.data = {'email': self.login_user.email, 'password': 'Apassword@123'}
+
+    def login(self, data=None):
+        return self.client.post('/user/login/', data or self.data, format='json')
+
+    def test_login_loads_user_and_token_in_one_query(self):
+        '''
+        Test that a login looks the user and their token up in a single query.
+        '''
+        with self.assertNumQueries(1):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], self.token.key)
+
+    def test_repeated_login_is_served_from_cache(self):
+        '''
+        Test that a repeated login skips the database but still checks the password.
+        '''
+        self.login()
+        with self.assertNumQueries(0):
+            response = self.login()
+        self.assertEqual(response.data['token'], self.token.key)
+
+        response = self.login({'email': self.login_user.email, 'password': 'wrongpassword'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_creates_missing_token(self):
+        '''
+        Test that a user without a token gets one on login.
+        '''
+        self.token.delete()
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], Token.objects.get(user=self.login_user).key)
+
+    def test_password_change_invalidates_cached_login(self):
+        '''
+        Test that the old password stops working as soon as the password is changed.
+        '''
+        self.login()
+        self.login_user.set_password('Newpassword@123')
+        self.login_user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.login({'email': self.login_user.email, 'password': 'Newpassword@123'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_reports_step_timings(self):
+        '''
+        Test that login responses break their latency down in a Server-Timing header.
+        '''
+        steps = [step.split(';')[0] for step in self.login()['Server-Timing'].split(', ')]
+        self.assertEqual(steps, ['lookup', 'hash', 'token'])
+        steps = [step.split(';')[0] for step in self.login()['Server-Timing'].split(', ')]
+        self.assertEqual(steps, ['lookup', 'hash'])
+
 
-     
 class ChangePasswordTests(ApiTestCase):
     
     def setUp(self):
@@ -208,6 +363,170 @@ class ChangePasswordTests(ApiTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class CachedTokenAuthenticationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = UserFactory(is_verified=True, password='Apassword@123')
+        self.token = self.authenticate(self.user)
+        # An uncached endpoint, so the request's own cost is one query.
+        self.url = '/book/list_favorites/'
+
+    def test_cached_token_skips_auth_queries(self):
+        """
+        Test a warm token costs no queries beyond the endpoint's own.
+        """
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_password_change_invalidates_cached_token(self):
+        """
+        Test changing the password drops the cached token.
+        """
+        data = {
+            'old_password': 'Apassword@123',
+            'new_password': 'Anewpassword@123',
+            'confirm_password': 'Anewpassword@123'
+        }
+        response = self.client.post('/user/change-password/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_logout_invalidates_cached_token(self):
+        """
+        Test logging out drops the cached token.
+        """
+        response = self.client.post('/user/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_user_change_invalidates_cached_token(self):
+        """
+        Test a demoted admin loses admin access at once instead of after the cache TTL.
+        """
+        self.authenticate(self.super_user)
+        self.assertEqual(self.client.get('/user/').status_code, status.HTTP_200_OK)
+        self.super_user.is_staff = False
+        self.super_user.save()
+        self.assertEqual(self.client.get('/user/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unrelated_user_save_keeps_cached_token(self):
+        """
+        Test saving fields that do not affect authentication leaves the cached token alone.
+        """
+        self.client.get(self.url)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_user_deletion_invalidates_cached_token(self):
+        """
+        Test a deleted user's token stops authenticating immediately.
+        """
+        self.client.get(self.url)
+        self.user.delete()
+        response = self.client.post('/user/logout/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserDirectoryTests(ApiTestCase):
+
+    def test_user_directory_is_admin_only(self):
+        """
+        Test the user directory rejects anonymous and non-admin users.
+        """
+        self.assertEqual(self.client.get('/user/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get('/user/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_directory_loads_only_serialized_columns(self):
+        """
+        Test the user directory searches by name and selects only the columns it renders.
+        """
+        UserFactory(email='ada@example.com', first_name='Ada', last_name='Lovelace')
+        self.authenticate(self.super_user)
+        self.client.get('/user/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/', {'last_name': 'lovel'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['email'] for user in response.data['results']], ['ada@example.com'])
+        self.assertTrue(response.data['results'][0]['is_active'])
+        sql = queries[-1]['sql']
+        self.assertIn('"user_customuser"."last_name"', sql)
+        self.assertNotIn('"user_customuser"."password"', sql)
+
+
+class TokenExpiryTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_redis_connection('default').delete(TOKEN_LAST_SEEN_KEY)
+        self.user = UserFactory(is_verified=True, password='Apassword@123')
+        self.token = self.authenticate(self.user)
+        self.url = '/book/list_favorites/'
+
+    def age_token(self, **delta):
+        Token.objects.filter(key=self.token.key).update(created=timezone.now() - timedelta(**delta))
+
+    def test_use_is_recorded_without_db_writes(self):
+        """
+        Test an authenticated request records its use in Redis and writes nothing to the database.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([query['sql'] for query in queries if not query['sql'].startswith('SELECT')], [])
+        self.assertIsNotNone(get_redis_connection('default').hget(TOKEN_LAST_SEEN_KEY, self.user.id))
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_unused_token_expires(self):
+        """
+        Test a token unused for longer than AUTH_TOKEN_TTL is rejected.
+        """
+        self.age_token(minutes=5)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(str(response.data['detail']), 'Token has expired.')
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_recent_use_slides_expiry(self):
+        """
+        Test an old token stays valid while it keeps being used, before and after a flush.
+        """
+        self.age_token(minutes=5)
+        touch_token(self.token)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Warm the token cache, then move the activity from Redis to the database.
+        flush_token_last_seen_task()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_login_replaces_expired_token(self):
+        """
+        Test logging in with an expired token issues a new one.
+        """
+        self.age_token(minutes=5)
+        response = self.client.post('/user/login/', {'email': self.user.email, 'password': 'Apassword@123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+    def test_logout_deletes_token(self):
+        """
+        Test logging out revokes the token.
+        """
+        response = self.client.post('/user/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 
 
 
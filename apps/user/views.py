@@ -1,26 +1,32 @@
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth import logout
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from .serializers import UserSerializer
-from .utils import send_verification_email
+from .utils import StepTimer, send_verification_email, verification_cache_key
 from .serializers import RegisterSerializer, LoginSerializer, ChangePasswordSerializer , UserSerializer
 from .filters import CustomUserFilter
+from .pagination import UserPagination
 
 
 User = get_user_model()
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    # Only the columns UserSerializer renders; is_active is a class attribute
+    # on AbstractBaseUser, not a column.
+    queryset = User.objects.only('id', 'email', 'first_name', 'last_name', 'date_joined')
     serializer_class = UserSerializer
+    permission_classes = [IsAdminUser]
     filter_backends = [DjangoFilterBackend]
     filterset_class = CustomUserFilter
+    pagination_class = UserPagination
     
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -28,28 +34,44 @@ class RegisterView(generics.CreateAPIView):
 
 class VerifyEmail(APIView):
     def get(self, request, verification_token):
-        user = get_object_or_404(User, verification_token=verification_token)
-        if user.is_verified:
+        # The token resolves to a user id in the cache; the users table is only
+        # touched by the UPDATE. Tokens stay until their TTL so a second click
+        # still gets "already verified".
+        user_id = cache.get(verification_cache_key(verification_token))
+        if user_id is None:
+            raise Http404
+        if not User.objects.filter(pk=user_id, is_verified=False).update(is_verified=True):
+            if not User.objects.filter(pk=user_id).exists():
+                raise Http404
             return Response({'message': 'Email already verified.'}, status=status.HTTP_400_BAD_REQUEST)
-        user.is_verified = True
-        user.save(update_fields= ["is_verified"]) 
         return Response({'message': 'Email verified successfully.'}, status=status.HTTP_200_OK)
 
 class LoginView(APIView):
+    # Logging in takes credentials, so a stale or expired token sent along
+    # with them must not turn the request into a 401.
+    authentication_classes = []
+
     def post(self, request):
-        serializer = LoginSerializer(data=request.data, context={'request': request})
+        # Server-Timing splits login latency into user lookup, password
+        # hashing and token creation.
+        timer = StepTimer()
+        serializer = LoginSerializer(data=request.data, context={'request': request, 'timer': timer})
         if serializer.is_valid():
-            # email = serializer.validated_data['email']
-            # user = User.objects.get(email=email)
-            user = serializer.validated_data['user']
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key}, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            token = serializer.validated_data['token']
+            response = Response({'token': token.key}, status=status.HTTP_200_OK)
+        else:
+            response = Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        response['Server-Timing'] = timer.header()
+        return response
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        # Deleting the token revokes it everywhere; its post_delete signal
+        # drops the cached copies.
+        if isinstance(request.auth, Token):
+            request.auth.delete()
         logout(request)
         return Response(status=status.HTTP_200_OK) 
 
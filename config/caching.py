@@ -0,0 +1,144 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import LockError
+from rest_framework.response import Response
+
+
+def generation_key(model):
+    return f'cache_generation:{model._meta.label_lower}'
+
+
+def get_generations(models):
+    keys = [generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Start from the clock rather than 0 so a counter that was evicted
+            # never comes back at a value old entries were stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+async def aget_generations(models):
+    keys = [generation_key(model) for model in models]
+    generations = await cache.aget_many(keys)
+    for key in keys:
+        if key not in generations:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            generations[key] = await cache.aget(key)
+    return [generations[key] for key in keys]
+
+
+def response_cache_key(request, scope, generations):
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    raw = repr((request.get_host(), request.path, params, generations))
+    return f'response:{scope}:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+
+def bump_generation(model):
+    key = generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_model(model):
+    # Bump now so follow-up reads in this request miss, and again on commit so
+    # an entry a concurrent request built from the pre-commit rows is orphaned too.
+    bump_generation(model)
+    transaction.on_commit(lambda: bump_generation(model))
+
+
+def get_or_set_single_flight(key, compute, timeout, stale_timeout=0, wait_timeout=10, poll_interval=0.05):
+    """
+    Return the cached value for `key`, calling `compute` at most once at a time.
+
+    Values are fresh for `timeout` seconds and then served stale for up to
+    `stale_timeout` more while the one caller holding the Redis lock refreshes
+    them. On a cold miss the other callers poll for that caller's result
+    instead of recomputing it themselves.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['expires_at'] > time.time():
+        return entry['value']
+
+    lock = cache.lock(f'{key}:lock', timeout=wait_timeout)
+    if not lock.acquire(blocking=False):
+        if entry is not None:
+            return entry['value']
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        # The lock holder died or is stuck; answer this request regardless.
+        return compute()
+
+    try:
+        # The previous lock holder may have refreshed it while we looked.
+        entry = cache.get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            return entry['value']
+        value = compute()
+        cache.set(key, {'value': value, 'expires_at': time.time() + timeout}, timeout + stale_timeout)
+        return value
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # compute() outlived the lock and someone else may hold it now.
+            pass
+
+
+async def aget_or_set_single_flight(key, compute, timeout, stale_timeout=0, **kwargs):
+    # Fresh hits are answered without leaving the event loop; misses and stale
+    # refreshes take the locking path above on a worker thread.
+    entry = await cache.aget(key)
+    if entry is not None and entry['expires_at'] > time.time():
+        return entry['value']
+    return await sync_to_async(get_or_set_single_flight)(key, compute, timeout, stale_timeout, **kwargs)
+
+
+class CachedResponseMixin:
+    """
+    Caches list and retrieve responses of a viewset.
+
+    Entries are keyed by the request path, the normalized query params and the
+    current generation of every model in `cache_models`. Writing to one of
+    those models bumps its generation (see `invalidate_model`), which orphans
+    every entry built from it without scanning for keys.
+    """
+    cache_models = None
+    cache_timeout = None
+
+    def get_cache_models(self):
+        return self.cache_models or [self.queryset.model]
+
+    def get_response_cache_key(self, request):
+        generations = get_generations(self.get_cache_models())
+        return response_cache_key(request, f'{self.basename}:{self.action}', generations)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout if self.cache_timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+            cache.set(key, response.data, timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
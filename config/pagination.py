@@ -0,0 +1,154 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key such as (created_at, id).
+
+    Pages are fetched with a range condition on the ordering columns instead of
+    an OFFSET, so with a matching composite index every page costs the same no
+    matter how deep into the table it is. The last ordering field must be
+    unique to break ties.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([instance async for instance in queryset.aiterator()])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.current_page_size = self.get_page_size(request)
+        self.current_ordering = self.get_ordering(request, queryset, view)
+        self.position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.current_ordering
+        if self.reverse:
+            ordering = tuple(self.invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.position_filter(ordering, self.position))
+        # One extra row tells us whether there is a next page.
+        return queryset[:self.current_page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.current_page_size
+        self.page = results[:self.current_page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def position_filter(self, ordering, position):
+        # (a, b) > (x, y) is expanded to a >= x AND (a > x OR (a = x AND b > y)).
+        # The leading bound on the first column is what lets the planner turn
+        # the condition into an index range scan.
+        names = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+        after = Q()
+        for index in range(len(names)):
+            step = Q(**{f'{names[index]}__{lookups[index]}': position[index]})
+            for prefix in range(index):
+                step &= Q(**{names[prefix]: position[prefix]})
+            after |= step
+        bound = Q(**{f'{names[0]}__{lookups[0]}e': position[0]})
+        return bound & after
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            names = [field.lstrip('-') for field in self.current_ordering]
+            if len(cursor['p']) != len(names):
+                raise ValueError
+            position = [self.to_python(model, name, value) for name, value in zip(names, cursor['p'])]
+            return position, bool(cursor['r'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def to_python(model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are stored in the cursor as-is.
+            return value
+
+    def encode_cursor(self, instance, reverse):
+        position = []
+        for field in self.current_ordering:
+            value = getattr(instance, field.lstrip('-'))
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        encoded = urlsafe_b64encode(json.dumps({'p': position, 'r': int(reverse)}).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
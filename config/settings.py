@@ -75,6 +75,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -147,7 +148,7 @@ print(DATABASES)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'apps.user.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication'
         
     ),
@@ -158,9 +159,51 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         # ...
     ),
-    
+    'DEFAULT_PAGINATION_CLASS': 'config.pagination.KeysetPagination',
+    'PAGE_SIZE': env.int('PAGE_SIZE', default=20),
 }
 
+# Upper bound for the ?page_size= query parameter on paginated list endpoints
+PAGINATION_MAX_PAGE_SIZE = env.int('PAGINATION_MAX_PAGE_SIZE', default=100)
+
+# How long CachedTokenAuthentication keeps a resolved token -> user in the cache
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', default=60)
+
+# API tokens expire after this many seconds without being used. Use is tracked
+# in Redis and flushed to the database every TOKEN_LAST_SEEN_FLUSH_INTERVAL seconds.
+AUTH_TOKEN_TTL = env.int('AUTH_TOKEN_TTL', default=14 * 24 * 60 * 60)
+TOKEN_LAST_SEEN_FLUSH_INTERVAL = env.int('TOKEN_LAST_SEEN_FLUSH_INTERVAL', default=60)
+TOKEN_LAST_SEEN_FLUSH_BATCH_SIZE = 1000
+TOKEN_PURGE_BATCH_SIZE = 1000
+
+# How long a successful login keeps the user and token it loaded in the cache,
+# so repeated logins skip the database. The password is still checked each time.
+LOGIN_CACHE_TIMEOUT = env.int('LOGIN_CACHE_TIMEOUT', default=60)
+
+# How long CachedResponseMixin keeps a list/retrieve response. Writes invalidate
+# entries immediately, so this only bounds how long unused entries linger.
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300)
+
+# average_ratings pages are fresh for AVERAGE_RATINGS_CACHE_TIMEOUT seconds, then
+# served stale for up to AVERAGE_RATINGS_STALE_TIMEOUT more while one request refreshes them
+AVERAGE_RATINGS_CACHE_TIMEOUT = env.int('AVERAGE_RATINGS_CACHE_TIMEOUT', default=60)
+AVERAGE_RATINGS_STALE_TIMEOUT = env.int('AVERAGE_RATINGS_STALE_TIMEOUT', default=300)
+
+# Hasher for new passwords: 'scrypt', 'argon2' (needs argon2-cffi) or 'pbkdf2'.
+# The others stay listed so existing hashes still verify, and are upgraded to
+# the preferred hasher the next time their user logs in.
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='scrypt')
+AVAILABLE_PASSWORD_HASHERS = {
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'pbkdf2_sha1': 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'bcrypt_sha256': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [AVAILABLE_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in AVAILABLE_PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -224,6 +267,15 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL =  env('DEFAULT_FROM_EMAIL')
 SITE_URL = env('SITE_URL', default='http://localhost:8000')
 
+# Verification emails are collected for this many seconds and sent over one
+# SMTP connection; 0 sends each one from its own task.
+VERIFICATION_EMAIL_BATCH_WINDOW = env.int('VERIFICATION_EMAIL_BATCH_WINDOW', default=5)
+VERIFICATION_EMAIL_BATCH_SIZE = 100
+
+# Email verification links are kept in the cache, not the users table, and stop
+# working after this many seconds
+VERIFICATION_TOKEN_TTL = env.int('VERIFICATION_TOKEN_TTL', default=7 * 24 * 60 * 60)
+
 
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
@@ -231,6 +283,40 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    # Re-score every book when the catalogue-wide mean rating drifts.
+    'refresh-book-rankings': {
+        'task': 'apps.review.tasks.refresh_book_rankings_task',
+        'schedule': 60 * 60,
+    },
+    'purge-deleted-books': {
+        'task': 'apps.book.tasks.purge_deleted_books_task',
+        'schedule': 24 * 60 * 60,
+    },
+    'flush-token-last-seen': {
+        'task': 'apps.user.tasks.flush_token_last_seen_task',
+        'schedule': TOKEN_LAST_SEEN_FLUSH_INTERVAL,
+    },
+    'purge-expired-tokens': {
+        'task': 'apps.user.tasks.purge_expired_tokens_task',
+        'schedule': 60 * 60,
+    },
+}
+
+# Most reviews accepted by one POST /review/bulk/, and the ingest_reviews default batch
+REVIEW_INGEST_BATCH_SIZE = env.int('REVIEW_INGEST_BATCH_SIZE', default=1000)
+
+# Rows fetched per round trip of the server-side cursor behind the export endpoints
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Soft-deleted books are hard-deleted by purge_deleted_books_task after this many days
+BOOK_TOMBSTONE_RETENTION_DAYS = env.int('BOOK_TOMBSTONE_RETENTION_DAYS', default=30)
+BOOK_PURGE_BATCH_SIZE = 500
+
+# Top books leaderboard
+TOP_BOOKS_PRIOR_WEIGHT = env.int('TOP_BOOKS_PRIOR_WEIGHT', default=10)
+TOP_BOOKS_MEAN_TIMEOUT = 60 * 60
+TOP_BOOKS_MAX_LIMIT = 100
 
 
 
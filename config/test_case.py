@@ -1,12 +1,18 @@
 #from django.contrib.auth import get_user_model
 import uuid
+from datetime import timedelta
+from random import Random
+from django.db import connection
 from django.test import override_settings
+from django.utils import timezone
 from apps.user.models import CustomUser
 from rest_framework.test import APITestCase
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 from apps.user.tests.factories import UserFactory
 from apps.book.tests.factories import BookFactory ,FavoriteFactory
+from apps.book.models import Book, Favorite
+from apps.review.models import Opinion
 
 
 class ApiTestMixin:
@@ -46,4 +52,73 @@ class ApiTestCase(APITestCase, ApiTestMixin):
         user.set_password('Apassword@123')  # Set the password used for login
     
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+class QueryPlanTestCase(ApiTestCase):
+    """
+    Seeds enough rows that the planner's choices match production, then checks
+    that queries are answered from an index rather than a sequential scan.
+    """
+    # The smallest sizes at which the planner prefers the indexes; subclasses
+    # that only query some tables can seed less.
+    users = 2000
+    books = 8000
+    opinions_per_book = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        random = Random(0)
+        # A vocabulary wide enough that a single word matches ~1% of books.
+        cls.words = words = [
+            ''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=random.randint(5, 9))) for _ in range(2000)
+        ]
+        now = timezone.now()
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                email=f'plan-{index}@example.com',
+                first_name=random.choice(words).title(),
+                last_name=random.choice(words).title(),
+                date_joined=now - timedelta(days=index),
+            )
+            for index in range(cls.users)
+        ])
+        books = Book.objects.bulk_create([
+            Book(
+                title=' '.join(random.sample(words, 3)).title() + f' {index}',
+                author=f'Author {random.randrange(cls.books // 10)}',
+                description=' '.join(random.choices(words, k=20)),
+                created_by=random.choice(users),
+                created_at=now - timedelta(minutes=index * 30),
+                is_deleted=random.random() < 0.1,
+                rating_count=random.randrange(50),
+                weighted_rating=random.random() * 5,
+                favorite_count=random.randrange(100),
+            )
+            for index in range(cls.books)
+        ])
+        Opinion.objects.bulk_create([
+            Opinion(book=book, user=users[(index + offset) % cls.users], rating=random.randrange(6), comment='c')
+            for index, book in enumerate(books)
+            for offset in range(cls.opinions_per_book)
+        ])
+        Favorite.objects.bulk_create([
+            Favorite(book=book, user=users[index % cls.users]) for index, book in enumerate(books[::2])
+        ])
+        with connection.cursor() as cursor:
+            # Bulk inserts leave rows in GIN pending lists, which only VACUUM or
+            # autovacuum would merge, and which make the planner cost the index
+            # as if every pending row had to be rechecked.
+            cursor.execute(
+                "SELECT gin_clean_pending_list(i.indexrelid) FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_am am ON am.oid = c.relam "
+                "WHERE am.amname = 'gin'"
+            )
+            for model in [CustomUser, Book, Opinion, Favorite]:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def assertNoSeqScan(self, queryset, label):
+        # Only the filtered table counts: hashing a page of rows against a
+        # joined table such as the book owners is a legitimate plan.
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        self.assertNotIn(f'Seq Scan on {table}', plan, f'{label} falls back to a sequential scan:\n{plan}')